@@ -0,0 +1,109 @@
+import asyncio
+import tarfile
+import zipfile
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+from fastapi import UploadFile
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError
+
+AUDIO_EXTENSIONS = (".wav",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class AsyncReader:
+    """Gives a blocking file object the async `read` of UploadFile, reading in a thread."""
+
+    def __init__(self, file):
+        self.file = file
+
+    async def read(self, size: int = -1) -> bytes:
+        return await asyncio.to_thread(self.file.read, size)
+
+
+def _is_audio(name: str) -> bool:
+    return name.lower().endswith(AUDIO_EXTENSIONS)
+
+
+async def iter_upload_entries(upload: UploadFile) -> AsyncIterator[Tuple[str, Optional[AsyncReader]]]:
+    """
+    Yield (name, reader) for every recording in one upload, one at a time.
+
+    Zip and tar archives are read entry by entry straight from the uploaded
+    file, without extracting them; tar archives are read as a stream. Entries
+    that are not audio are yielded with a None reader so they can be reported.
+    A corrupt archive raises partway through; the uploads after it are read
+    separately, so they are not affected.
+    """
+    name = upload.filename or "upload"
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        archive = await asyncio.to_thread(zipfile.ZipFile, upload.file)
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if not _is_audio(info.filename):
+                    yield info.filename, None
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, AsyncReader(member)
+    elif lower.endswith(TAR_EXTENSIONS):
+        archive = await asyncio.to_thread(tarfile.open, fileobj=upload.file, mode="r|*")
+        with archive:
+            while (member := await asyncio.to_thread(archive.next)) is not None:
+                if not member.isfile():
+                    continue
+                if not _is_audio(member.name):
+                    yield member.name, None
+                    continue
+                yield member.name, AsyncReader(archive.extractfile(member))
+    else:
+        yield name, upload if _is_audio(name) else None
+
+
+class CaseInserter:
+    """
+    Buffers finished case documents and stores them with one insert_many per
+    `batch_size` cases. `on_inserted(doc, inserted_id, context)` runs for every
+    stored case and `on_failed(doc, error, context)` for every rejected one.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, on_inserted: Callable[..., Awaitable],
+                 on_failed: Callable[..., Awaitable], batch_size=50):
+        self.collection = collection
+        self.on_inserted = on_inserted
+        self.on_failed = on_failed
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = asyncio.Lock()
+
+    async def add(self, doc: dict, context):
+        self._pending.append((doc, context))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            failed = {}
+            try:
+                result = await self.collection.insert_many([doc for doc, _ in pending], ordered=False)
+                inserted_ids = result.inserted_ids
+            except BulkWriteError as e:
+                failed = {error["index"]: error.get("errmsg", "insert failed") for error in e.details.get("writeErrors", [])}
+                inserted_ids = [doc.get("_id") for doc, _ in pending]
+            except Exception as e:
+                failed = {index: str(e) for index in range(len(pending))}
+                inserted_ids = [None] * len(pending)
+            for index, ((doc, context), inserted_id) in enumerate(zip(pending, inserted_ids)):
+                try:
+                    if index in failed:
+                        await self.on_failed(doc, failed[index], context)
+                    else:
+                        await self.on_inserted(doc, inserted_id, context)
+                except Exception as e:
+                    print(f"Error finishing stored case: {e}")
+
@@ -0,0 +1,80 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of pipeline results, stored in MongoDB.
+
+    Audio entries are keyed by the SHA-256 of the uploaded bytes and hold the
+    transcript with its timed segments, the duration and the GridFS id of the
+    first copy. Transcript entries are keyed by the SHA-256 of the text and hold
+    one result per stage, each tagged with the version of the model or lexicon
+    that produced it; a stage result only counts as a hit while its version is
+    current.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def get_audio(self, digest: str, version: str) -> Optional[Dict[str, Any]]:
+        entry = await self.collection.find_one({"_id": f"audio:{digest}"})
+        if entry is None or entry.get("version") != version:
+            return None
+        return entry
+
+    async def put_audio(self, digest: str, version: str, wav_file_id: str, duration: str, conversation: str,
+                        segments: Optional[List[dict]] = None):
+        await self.collection.update_one(
+            {"_id": f"audio:{digest}"},
+            {"$set": {
+                "version": version,
+                "wav_file_id": wav_file_id,
+                "duration": duration,
+                "conversation": conversation,
+                "segments": segments or [],
+                "updated": datetime.now(),
+            }},
+            upsert=True,
+        )
+
+    @staticmethod
+    def _current_stages(entry, versions: Dict[str, str]) -> Dict[str, Any]:
+        stages = entry.get("stages", {})
+        return {
+            stage: stages[stage]["value"]
+            for stage, version in versions.items()
+            if stage in stages and stages[stage].get("version") == version
+        }
+
+    async def get_stages(self, digest: str, versions: Dict[str, str]) -> Dict[str, Any]:
+        """Cached stage results for a transcript whose versions match `versions`."""
+        entry = await self.collection.find_one({"_id": f"text:{digest}"})
+        if entry is None:
+            return {}
+        return self._current_stages(entry, versions)
+
+    async def get_stages_many(self, digests: Iterable[str], versions: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """Cached stage results of many transcripts in one query, by digest; only the requested stages are read."""
+        found = {}
+        query = {"_id": {"$in": [f"text:{digest}" for digest in digests]}}
+        async for entry in self.collection.find(query, {f"stages.{stage}": 1 for stage in versions}):
+            found[entry["_id"][len("text:"):]] = self._current_stages(entry, versions)
+        return found
+
+    async def put_stages(self, digest: str, versions: Dict[str, str], values: Dict[str, Any]):
+        if not values:
+            return
+        update = {
+            f"stages.{stage}": {"version": versions[stage], "value": value}
+            for stage, value in values.items()
+        }
+        update["updated"] = datetime.now()
+        await self.collection.update_one({"_id": f"text:{digest}"}, {"$set": update}, upsert=True)
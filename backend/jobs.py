@@ -0,0 +1,206 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class IngestJob:
+    """Tracks the progress of one queued case through the pipeline stages."""
+
+    def __init__(self, case_id: str, stages):
+        self.case_id = case_id
+        self.status = "queued"
+        self.stages: Dict[str, str] = {stage: PENDING for stage in stages}
+        self.error: Optional[str] = None
+        self.created = datetime.now()
+        self.updated = self.created
+        # Summary progress, streamed to clients while the summary stage runs
+        self.partial_summaries: List[dict] = []
+        self.summary = ""
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _set(self, stage: str, state: str):
+        self.stages[stage] = state
+        self.updated = datetime.now()
+        self._notify()
+
+    def publish_summary(self, event: str, data: dict):
+        """Progress callback for summarize_text_async."""
+        if event == "partial":
+            self.partial_summaries.append(data)
+        else:
+            self.summary = data["summary"]
+        self._notify()
+
+    async def follow_summary(self) -> AsyncIterator[Tuple[str, dict]]:
+        """Yields the summary progress so far, then new progress until the summary stage ends."""
+        sent_partials = 0
+        sent_summary = ""
+        while True:
+            changed = self._changed
+            for partial in self.partial_summaries[sent_partials:]:
+                yield "partial", partial
+            sent_partials = len(self.partial_summaries)
+            if self.summary != sent_summary:
+                sent_summary = self.summary
+                yield "summary", {"summary": sent_summary}
+            if self.stages.get("summary") in (DONE, FAILED) or self.status == "failed":
+                return
+            await changed.wait()
+
+    def start_stage(self, stage: str):
+        self._set(stage, RUNNING)
+
+    def finish_stage(self, stage: str):
+        self._set(stage, DONE)
+
+    def fail(self, error: str):
+        for stage, state in self.stages.items():
+            if state == RUNNING:
+                self.stages[stage] = FAILED
+        self.status = "failed"
+        self.error = error
+        self.updated = datetime.now()
+        self._notify()
+
+    def to_dict(self):
+        return {
+            "id": self.case_id,
+            "status": self.status,
+            "stages": dict(self.stages),
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+
+class JobStore:
+    """
+    Records of queued jobs in MongoDB, so they outlive the process.
+
+    A record holds what it takes to run the job again after a restart. It is
+    removed once the case is stored; failed jobs keep theirs, so their status
+    stays readable.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def add(self, job: IngestJob, **fields):
+        await self.collection.insert_one({
+            "_id": job.case_id,
+            "status": job.status,
+            "error": None,
+            "created": job.created,
+            "updated": job.updated,
+            **fields,
+        })
+
+    async def set_status(self, case_id: str, status: str, error: Optional[str] = None):
+        await self.collection.update_one(
+            {"_id": case_id}, {"$set": {"status": status, "error": error, "updated": datetime.now()}}
+        )
+
+    async def remove(self, case_id: str):
+        await self.collection.delete_one({"_id": case_id})
+
+    async def get(self, case_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": case_id})
+
+    async def unfinished(self) -> List[dict]:
+        """Jobs that were queued or running when the process stopped, oldest first."""
+        cursor = self.collection.find({"status": {"$in": ["queued", "processing"]}}).sort("created", 1)
+        return await cursor.to_list(length=None)
+
+
+class JobQueue:
+    """
+    Bounded queue of ingestion jobs served by a fixed number of asyncio workers.
+
+    `submit` never waits: when the queue is full it raises `asyncio.QueueFull`
+    so the caller can push back on the client. Finished jobs are remembered
+    (up to `history_size`) so their status stays readable. With a `store`,
+    status changes are also written to the jobs' records.
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable], max_size=100, workers=4, history_size=1000,
+                 store: Optional[JobStore] = None):
+        self.handler = handler
+        self.workers = workers
+        self.history_size = history_size
+        self.store = store
+        self._queue = asyncio.Queue(maxsize=max_size)
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._tasks = []
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def get(self, case_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(case_id)
+
+    def submit(self, job: IngestJob, *args):
+        self._queue.put_nowait((job, args))
+        self._remember(job)
+
+    async def resubmit(self, job: IngestJob, *args):
+        """Queue a job recovered after a restart, waiting for room in the queue."""
+        await self._queue.put((job, args))
+        self._remember(job)
+
+    def _remember(self, job: IngestJob):
+        self._jobs[job.case_id] = job
+        while len(self._jobs) > self.history_size:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status not in ("completed", "failed"):
+                break
+            del self._jobs[oldest_id]
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _record(self, update: Awaitable):
+        # The job itself goes on even if its record can't be written
+        try:
+            await update
+        except Exception as e:
+            print(f"Error updating job record: {e}")
+
+    async def _work(self):
+        while True:
+            job, args = await self._queue.get()
+            job.status = "processing"
+            if self.store:
+                await self._record(self.store.set_status(job.case_id, job.status))
+            try:
+                await self.handler(job, *args)
+                job.status = "completed"
+                if self.store:
+                    await self._record(self.store.remove(job.case_id))
+            except Exception as e:
+                print(f"Job {job.case_id} failed: {e}")
+                job.fail(str(e))
+                if self.store:
+                    await self._record(self.store.set_status(job.case_id, job.status, job.error))
+            finally:
+                self._queue.task_done()
@@ -1,32 +1,48 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from bson import ObjectId
-from mutagen.wave import WAVE
+from pymongo import UpdateOne
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Union
 
 import os
-import aiofiles
 import asyncio
-import threading
-from functools import partial
-from concurrent.futures import ThreadPoolExecutor
-from tempfile import NamedTemporaryFile
-from math import floor
+import base64
+import json
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from model.extract_entities import extract_person_names
-from model.score import SuspiciousWordDetector
-from model.speech_to_text import speech_to_text_func
-from model.transcript import summarize_text
-
+from model.expansion import RelatedWordsExpander
+from model.matches import score_matches
+from model.metrics import REGISTRY, SIZE_BUCKETS, counter, gauge, histogram
+from model.speech_to_text import LiveAudioBuffer, transcription_version
+from model.streaming import StreamingScorer
+from model.transcript import summarize_text_async, summary_version
+
+from .batch import CaseInserter, iter_upload_entries
+from .cache import ResultCache, text_digest
+from .jobs import IngestJob, JobQueue, JobStore
+from .rescoring import Rescorer
+from .stats import TTLCache, compute_stats
 from .types import *
-
-# Global thread pool for CPU-bound tasks
-CPU_BOUND_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() * 2)
+from .uploads import download_to_temp, remove_file, stream_upload
+from .watchlist import WatchlistIndex
+from .workers import (
+    WorkerPool,
+    entities_version,
+    expand_related_words,
+    extract_entities,
+    get_audio_duration,
+    get_lexicon,
+    match_text,
+    score_segment,
+    transcribe,
+    transcribe_pcm,
+)
 
 # Database Configuration
 load_dotenv()
@@ -40,88 +56,213 @@ client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 collection_cases = db[COLLECTION_NAME_CASES]
 collection_users = db[COLLECTION_NAME_USERS]
+collection_jobs = db["jobs"]
 fs = AsyncIOMotorGridFSBucket(db)
 
-# Suspicious word detector model
-detector = SuspiciousWordDetector(
-    binary_file_path="model/words2vec.bin"
+# Results of earlier runs on identical audio or transcripts are reused unless RESULT_CACHE=0
+RESULT_CACHE = os.getenv("RESULT_CACHE", "1").lower() not in ("0", "false", "no")
+result_cache = ResultCache(db["cache"]) if RESULT_CACHE else None
+
+# Ingestion mode: "sync" answers POST /cases with the finished case, "async" queues it
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+PIPELINE_STAGES = ("transcription", "entities", "scoring", "summary", "storage")
+
+# Bulk ingestion: files analyzed at once per batch, cases per insert_many, and files per request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_INSERT_SIZE = int(os.getenv("BATCH_INSERT_SIZE", "50"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+
+# Executors for the pipeline stages; they own the detector and NER models, which load lazily
+worker_pool = WorkerPool.from_env()
+
+# Model warm-up at startup: "background" serves requests while loading, "blocking" waits, "off" loads on first use
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
+warmup_error: Optional[str] = None
+
+# Single background worker growing the lexicon with words related to flagged keywords
+related_words_expander = RelatedWordsExpander(
+    lambda keywords: worker_pool.submit("expand", expand_related_words, keywords).result(),
+    max_queue=int(os.getenv("EXPANSION_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("EXPANSION_BATCH_SIZE", "32")),
+    max_seen=int(os.getenv("EXPANSION_MAX_SEEN", "10000")),
 )
 
+# Watchlist users by normalized name and phone, kept in sync by the /watchlist endpoints
+watchlist_index = WatchlistIndex(fuzzy_threshold=float(os.getenv("WATCHLIST_FUZZY_THRESHOLD", "0.8")))
+
+# Metrics for /metrics; per-case stage timings are also stored on each case
+STAGE_SECONDS = histogram("traceflow_stage_duration_seconds", "Time spent in each case pipeline stage", ("stage",))
+PAYLOAD_BYTES = histogram("traceflow_payload_bytes", "Size of uploaded audio and generated text", ("kind",), SIZE_BUCKETS)
+CASES = counter("traceflow_cases_total", "Cases processed, by outcome", ("outcome",))
+CACHE_HITS = counter("traceflow_result_cache_hits_total", "Pipeline stages answered from the result cache", ("stage",))
+gauge("traceflow_executor_in_flight", "Stage tasks submitted to the worker pool and not finished", ("stage",),
+      lambda: {(stage,): count for stage, count in worker_pool.executor_stats()["in_flight"].items()})
+gauge("traceflow_executor_active_workers", "Worker pool workers busy with a task",
+      callback=lambda: {(): worker_pool.executor_stats()["active"]})
+gauge("traceflow_executor_queue_depth", "Stage tasks waiting for a free worker",
+      callback=lambda: {(): worker_pool.executor_stats()["queued"]})
+gauge("traceflow_executor_workers", "Size of the worker pool", callback=lambda: {(): worker_pool.cpu_workers})
+gauge("traceflow_model_load_seconds", "How long each model took to load, per process", ("pid", "model"),
+      lambda: worker_pool.model_load_seconds())
+gauge("traceflow_ingest_queue_depth", "Cases waiting in the ingestion queue", callback=lambda: {(): len(job_queue)})
+gauge("traceflow_expansion_queue_depth", "Keywords waiting for related-word expansion",
+      callback=lambda: {(): related_words_expander.stats()["queue_depth"]})
+gauge("traceflow_lexicon_entries", "Entries in the suspicious-words lexicon", callback=lambda: {(): len(get_lexicon())})
+
 # Helper function for converting MongoDB documents
 def mongo_to_dict(doc):
     doc["id"] = str(doc["_id"])
     doc.pop("_id", None)
     return doc
 
-# Helper function to save file to temporary location
-async def save_file_to_temp(wavFile: UploadFile)-> str:
-    with NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-        async with aiofiles.open(temp_file.name, 'wb') as out_file:
-            while chunk := await wavFile.read(8192):
-                await out_file.write(chunk)
-    return temp_file.name
+# Dashboard statistics are cached briefly and dropped whenever cases change
+stats_cache = TTLCache(ttl=float(os.getenv("STATS_TTL_SECONDS", "30")))
+
+# Case listing: newest first, paginated with an opaque (timestamp, _id) cursor
+CASE_SORT = [("timestamp", -1), ("_id", -1)]
+CASE_LIST_PROJECTION = {"script": 0, "summary": 0, "segments": 0, "lexiconMatches": 0}
+
+def encode_cursor(case) -> str:
+    raw = f"{case['timestamp'].isoformat()}|{case['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, case_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(case_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def ensure_indexes():
+    try:
+        await collection_cases.create_index(CASE_SORT)
+        for field in ("severity", "status", "type"):
+            await collection_cases.create_index([(field, 1)] + CASE_SORT)
+        await collection_users.create_index("cases")
+        # Records of failed jobs are kept a week for status lookups
+        await collection_jobs.create_index(
+            "updated", expireAfterSeconds=7 * 24 * 3600, partialFilterExpression={"status": "failed"}
+        )
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+
+async def load_watchlist():
+    try:
+        watchlist_index.load(await collection_users.find({}, {"name": 1, "phoneNumber": 1}).to_list(length=None))
+    except Exception as e:
+        print(f"Error loading watchlist: {e}")
+
+# Mark the watchlist users mentioned in a case, in one bulk write
+async def link_watchlist_users(case_id: ObjectId, user_ids, timestamp: datetime):
+    operations = [
+        UpdateOne(
+            {"_id": ObjectId(user_id)},
+            {"$max": {"lastMentioned": timestamp}, "$addToSet": {"cases": str(case_id)}},
+        )
+        for user_id in user_ids
+    ]
+    if operations:
+        await collection_users.bulk_write(operations, ordered=False)
+
+# Run one pipeline step, timing it and reporting its progress on the job if there is one
+async def track_stage(job: Optional[IngestJob], stage: str, awaitable, timings: Optional[Dict[str, float]] = None):
+    if job:
+        job.start_stage(stage)
+    started = time.perf_counter()
+    result = await awaitable
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed, stage=stage)
+    if timings is not None:
+        timings[stage] = round(elapsed, 4)
+    if job:
+        job.finish_stage(stage)
+    return result
 
 # Audio processing function
-async def process_audio_file(temp_file_name: str):
-    loop = asyncio.get_event_loop()
+async def process_audio_file(temp_file_name: str, job: Optional[IngestJob] = None, timings: Optional[Dict[str, float]] = None):
+    duration_task = track_stage(None, "duration", worker_pool.run("duration", get_audio_duration, temp_file_name), timings)
+    conversation_task = track_stage(job, "transcription", worker_pool.run("transcribe", transcribe, temp_file_name), timings)
     
-    duration_task = loop.run_in_executor(
-        CPU_BOUND_EXECUTOR, 
-        partial(get_audio_duration, temp_file_name)
-    )
-    conversation_task = loop.run_in_executor(
-        CPU_BOUND_EXECUTOR, 
-        speech_to_text_func, 
-        temp_file_name
-    )
-    
-    duration, conversation = await asyncio.gather(duration_task, conversation_task)
-    return duration, conversation
+    duration, transcript = await asyncio.gather(duration_task, conversation_task)
+    return duration, transcript
+
+# Version of the NER engine the workers loaded, which is fp32 rather than NER_BACKEND when that failed to load
+_ner_cache_version: Optional[str] = None
 
-def get_audio_duration(file_path: str) -> str:
-    audio = WAVE(file_path)
-    return '{:02d}:{:02d}'.format(*divmod(floor(audio.info.length), 60))
+async def get_ner_cache_version() -> str:
+    global _ner_cache_version
+    if _ner_cache_version is None:
+        _ner_cache_version = await worker_pool.run("ner", entities_version)
+    return _ner_cache_version
 
 # Metadata extraction function
-async def extract_metadata_and_score(conversation: str):
-    loop = asyncio.get_event_loop()
-
-    # Run tasks concurrently with CPU_BOUND_EXECUTOR
-    related_entities_future = loop.run_in_executor(CPU_BOUND_EXECUTOR, extract_person_names, conversation)
-    score_details_future = loop.run_in_executor(CPU_BOUND_EXECUTOR, detector.calculate_score, conversation)
-    summary_future = loop.run_in_executor(CPU_BOUND_EXECUTOR, summarize_text, conversation)
-
-    # Wait for all tasks to complete
-    related_entities, score_details, summary = await asyncio.gather(
-        related_entities_future, 
-        score_details_future, 
-        summary_future
-    )
+async def extract_metadata_and_score(conversation: str, job: Optional[IngestJob] = None, timings: Optional[Dict[str, float]] = None):
+    # Stage results for an identical transcript are reused while their model and lexicon versions are current
+    cached = {}
+    if result_cache:
+        lexicon = get_lexicon()
+        await asyncio.to_thread(lexicon.refresh)
+        digest = text_digest(conversation)
+        versions = {
+            "entities": await get_ner_cache_version(),
+            "scoring": f"matches/lexicon-{lexicon.version}",
+            "summary": summary_version(),
+        }
+        cached = await result_cache.get_stages(digest, versions)
+
+    async def cached_stage(stage: str, value):
+        CACHE_HITS.inc(stage=stage)
+        if timings is not None:
+            timings[stage] = 0.0
+        if job:
+            job.start_stage(stage)
+            if stage == "summary":
+                job.publish_summary("summary", {"summary": value})
+            job.finish_stage(stage)
+        return value
+
+    # Lemmatized sentences are cached too, for re-scoring the case after lexicon edits
+    tokenized = {}
+
+    async def run_scoring():
+        scoring, sentences, tokenizer = await worker_pool.run("score", match_text, conversation)
+        tokenized.update(version=tokenizer, sentences=sentences)
+        return scoring
+
+    stages = {
+        "entities": lambda: worker_pool.run("ner", extract_entities, conversation),
+        "scoring": run_scoring,
+        "summary": lambda: summarize_text_async(conversation, on_progress=job.publish_summary if job else None),
+    }
+    # Run the missing stages concurrently, each on the executor for its stage
+    related_entities, scoring, summary = await asyncio.gather(*(
+        cached_stage(stage, cached[stage]) if stage in cached else track_stage(job, stage, run(), timings)
+        for stage, run in stages.items()
+    ))
 
-    # Unpack score details
-    score, flagged_keywords, categories = score_details
+    if result_cache:
+        computed = {"entities": related_entities, "scoring": scoring, "summary": summary}
+        computed = {stage: value for stage, value in computed.items() if stage not in cached}
+        if tokenized:
+            versions["sentences"] = tokenized["version"]
+            computed["sentences"] = tokenized["sentences"]
+        await result_cache.put_stages(digest, versions, computed)
 
-    # Optional background task for related words
-    def background_task():
-        try:
-            detector.add_related_words(flagged_keywords)
-        except Exception as e:
-            print(f"Background task error: {e}")
+    score, flagged_keywords, categories = score_matches(scoring["matches"])
 
-    threading.Thread(target=background_task, daemon=True).start()
+    # Optional background expansion of the lexicon with related words
+    related_words_expander.submit(flagged_keywords)
 
     return related_entities, {
         "score": score,
         "flagged_keywords": flagged_keywords,
-        "categories": categories
+        "categories": categories,
+        "matches": scoring["matches"],
+        "lexicon_version": scoring["lexiconVersion"],
     }, summary
 
-# Save audio to GridFS
-async def save_audio_to_gridfs(temp_file_name: str, filename: str):
-    async with aiofiles.open(temp_file_name, 'rb') as wav_file:
-        file_content = await wav_file.read()
-        return await fs.upload_from_stream(filename=filename, source=file_content)
-
 # Severity determination
 def determine_severity(score: int) -> str:
     if score < 30:
@@ -130,8 +271,192 @@ def determine_severity(score: int) -> str:
         return 'medium'
     return 'high'
 
+# Everything but the insert: returns the case document and what to run once it is stored
+async def analyze_case(
+    temp_file_name: str,
+    file_id: ObjectId,
+    audio_digest: str,
+    timings: Dict[str, float],
+    source: str,
+    type: str,
+    timestamp: datetime,
+    case_id: Optional[ObjectId] = None,
+    job: Optional[IngestJob] = None,
+):
+    started = time.perf_counter()
+    audio_version = transcription_version()
+    cached_audio = await result_cache.get_audio(audio_digest, audio_version) if result_cache else None
+    if cached_audio:
+        duration, conversation = cached_audio["duration"], cached_audio["conversation"]
+        segments, transcription_errors = cached_audio.get("segments", []), []
+        CACHE_HITS.inc(stage="transcription")
+        timings["transcription"] = 0.0
+        if job:
+            job.start_stage("transcription")
+            job.finish_stage("transcription")
+    else:
+        duration, transcript = await process_audio_file(temp_file_name, job, timings)
+        conversation, segments, transcription_errors = transcript["text"], transcript["segments"], transcript["errors"]
+    PAYLOAD_BYTES.observe(len(conversation.encode("utf-8")), kind="transcript")
+
+    related_entities, score_details, summary = await extract_metadata_and_score(conversation, job, timings)
+    PAYLOAD_BYTES.observe(len(summary.encode("utf-8")), kind="summary")
+    watchlist_matches = sorted(watchlist_index.match(related_entities, conversation))
+
+    case_data = {
+        "source": source,
+        "severity": determine_severity(score_details["score"]),
+        "status": 'new',
+        "type": type,
+        "timestamp": timestamp,
+        "riskScore": score_details["score"],
+        "flaggedKeywords": score_details["flagged_keywords"],
+        "reason": score_details["categories"],
+        "lexiconMatches": score_details["matches"],
+        "lexiconVersion": score_details["lexicon_version"],
+        "script": conversation,
+        "segments": segments,
+        "transcriptionErrors": transcription_errors,
+        "summary": summary,
+        "duration": duration,
+        "related_entities": related_entities,
+        "watchlistMatches": watchlist_matches,
+        "wav_file_id": str(file_id),
+        "timings": timings,
+    }
+    if case_id is not None:
+        case_data["_id"] = case_id
+
+    # Point duplicates at the stored copy of the audio, as long as it is still in GridFS
+    duplicate_of = None
+    if cached_audio and ObjectId.is_valid(cached_audio["wav_file_id"]):
+        if await db["fs.files"].count_documents({"_id": ObjectId(cached_audio["wav_file_id"])}, limit=1):
+            duplicate_of = cached_audio["wav_file_id"]
+            case_data["wav_file_id"] = duplicate_of
+
+    # Stored with the case; the insert's own time only reaches the metrics
+    timings["total"] = round(time.perf_counter() - started, 4) + timings.get("upload", 0.0)
+
+    async def after_insert(inserted_id: ObjectId):
+        stats_cache.invalidate()
+        try:
+            await link_watchlist_users(inserted_id, watchlist_matches, timestamp)
+        except Exception as e:
+            print(f"Error updating watchlist users: {e}")
+        # The case is stored by now, so failing to deduplicate or cache its audio must not fail the request
+        try:
+            if duplicate_of:
+                await fs.delete(file_id)
+            elif result_cache and not transcription_errors:
+                # Transcripts with failed chunks are not cached, so the next upload tries again
+                await result_cache.put_audio(audio_digest, audio_version, str(file_id), duration, conversation, segments)
+        except Exception as e:
+            print(f"Error caching audio of case {inserted_id}: {e}")
+        case_data["id"] = str(inserted_id)
+        case_data.pop("_id", None)
+        case_data["timestamp"] = case_data["timestamp"].isoformat()
+        return case_data
+
+    return case_data, after_insert
+
+# Full case pipeline on a staged upload, shared by synchronous requests and queued jobs. The temp file is
+# removed afterwards; the audio is dropped from GridFS only when the pipeline fails before the case is stored
+async def process_staged_upload(temp_file_name: str, file_id: ObjectId, *args, job: Optional[IngestJob] = None):
+    try:
+        case_data, after_insert = await analyze_case(temp_file_name, file_id, *args, job=job)
+        result = await track_stage(job, "storage", collection_cases.insert_one(case_data))
+    except asyncio.CancelledError:
+        # A queued job stopped by a shutdown keeps its audio and is run again on the next start
+        if job is None:
+            await fs.delete(file_id)
+        raise
+    except BaseException:
+        CASES.inc(outcome="failed")
+        await fs.delete(file_id)
+        raise
+    finally:
+        remove_file(temp_file_name)
+    CASES.inc(outcome="completed")
+    return await after_insert(result.inserted_id)
+
+async def run_case_job(job: IngestJob, temp_file_name: str, file_id: ObjectId, audio_digest: str, timings: Dict[str, float], source: str, type: str, timestamp: datetime):
+    await process_staged_upload(temp_file_name, file_id, audio_digest, timings, source, type, timestamp, ObjectId(job.case_id), job=job)
+
+job_store = JobStore(collection_jobs)
+job_queue = JobQueue(run_case_job, max_size=INGEST_QUEUE_SIZE, workers=INGEST_WORKERS, store=job_store)
+
+# Requeue the jobs that were queued or running when the process stopped
+async def restore_jobs():
+    try:
+        records = await job_store.unfinished()
+    except Exception as e:
+        print(f"Error loading unfinished jobs: {e}")
+        return
+    for record in records:
+        case_id = record["_id"]
+        try:
+            if await collection_cases.count_documents({"_id": ObjectId(case_id)}, limit=1):
+                # Stored just before the restart
+                await job_store.remove(case_id)
+                continue
+            temp_file_name = record.get("temp_file_name")
+            if not temp_file_name or not os.path.exists(temp_file_name):
+                temp_file_name = await download_to_temp(fs, ObjectId(record["file_id"]))
+        except Exception as e:
+            print(f"Could not requeue job {case_id}: {e}")
+            await job_store.set_status(case_id, "failed", f"Could not be resumed after a restart: {e}")
+            try:
+                await fs.delete(ObjectId(record["file_id"]))
+            except Exception:
+                pass
+            continue
+        job = IngestJob(case_id, PIPELINE_STAGES)
+        await job_queue.resubmit(
+            job, temp_file_name, ObjectId(record["file_id"]), record["audio_digest"], record.get("timings", {}),
+            record["source"], record["type"], record["timestamp"],
+        )
+
+# Brings stored cases up to date after lexicon edits, checkpointing its progress in the "rescoring" collection
+rescorer = Rescorer(
+    collection_cases,
+    db["rescoring"],
+    result_cache,
+    worker_pool,
+    determine_severity,
+    batch_size=int(os.getenv("RESCORE_BATCH_SIZE", "100")),
+    on_batch=stats_cache.invalidate,
+)
+
+async def warm_up_models():
+    global warmup_error
+    try:
+        await asyncio.to_thread(worker_pool.warm_up)
+    except Exception as e:
+        warmup_error = str(e)
+        print(f"Model warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    await load_watchlist()
+    await job_queue.start()
+    restore_task = asyncio.create_task(restore_jobs())
+    await rescorer.resume_interrupted()
+    warmup_task = None
+    if WARMUP_MODE == "blocking":
+        await warm_up_models()
+    elif WARMUP_MODE == "background":
+        warmup_task = asyncio.create_task(warm_up_models())
+    yield
+    if warmup_task:
+        warmup_task.cancel()
+    restore_task.cancel()
+    await rescorer.stop()
+    await job_queue.stop()
+    worker_pool.shutdown()
+
 # FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -140,18 +465,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of the API process."""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def get_readiness():
+    """Reports which models are loaded; answers 503 until the pipeline can run without loading them."""
+    status = {**worker_pool.status(), "warmup": WARMUP_MODE, "error": warmup_error}
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # Cases Endpoints
-@app.get("/cases", response_model=List[Case])
-async def get_cases():
-    cases = []
+@app.get("/cases", response_model=List[CaseListItem])
+async def get_cases(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|list)$"),
+):
+    """
+    Lists cases newest first, one page at a time. Pass the X-Next-Cursor header
+    of a page as `cursor` to get the next one. `view=list` leaves out the
+    transcript and summary.
+    """
+    query = {
+        field: value
+        for field, value in (("severity", severity), ("status", status), ("type", type))
+        if value is not None
+    }
+    if cursor:
+        timestamp, case_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": case_id}},
+        ]
+    projection = CASE_LIST_PROJECTION if view == "list" else None
+
     try:
-        async for case in collection_cases.find():
-            cases.append(mongo_to_dict(case))
+        cases = await collection_cases.find(query, projection).sort(CASE_SORT).limit(limit).to_list(length=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving cases: {str(e)}")
-    return cases
+    if len(cases) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(cases[-1])
+    return [mongo_to_dict(case) for case in cases]
+
+@app.get("/cases/{case_id}", response_model=Case)
+async def get_case(case_id: str):
+    if not ObjectId.is_valid(case_id):
+        raise HTTPException(status_code=400, detail="Invalid case ID format")
+    try:
+        case = await collection_cases.find_one({"_id": ObjectId(case_id)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving case: {str(e)}")
+    if case is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return mongo_to_dict(case)
 
 @app.get("/files/{file_id}")
 async def get_audio_file(file_id: str):
@@ -162,47 +537,302 @@ async def get_audio_file(file_id: str):
     except Exception as e:
         raise HTTPException(status_code=404, detail="File not found")
 
-@app.post("/cases", response_model=Case)
+@app.post("/cases", response_model=Union[Case, CaseJob])
 async def create_case(
     source: str = Form(...),
     type: str = Form(...),
     wavFile: UploadFile = File(...),
 ):
     try:
-        temp_file_name = await save_file_to_temp(wavFile)
-        print(f"Saved file to {temp_file_name}")
-        duration, conversation = await process_audio_file(temp_file_name)
-        
-        related_entities, score_details, summary = await extract_metadata_and_score(conversation)
-        file_id = await save_audio_to_gridfs(temp_file_name, wavFile.filename)
-
-        case_data = {
-            "source": source,
-            "severity": determine_severity(score_details["score"]),
-            "status": 'new',
-            "type": type,
-            "timestamp": datetime.now(),
-            "riskScore": score_details["score"],
-            "flaggedKeywords": score_details["flagged_keywords"],
-            "reason": score_details["categories"],
-            "script": conversation,
-            "summary": summary,
-            "duration": duration,
-            "related_entities": related_entities,
-            "wav_file_id": str(file_id),
-        }
+        if INGEST_MODE == "async" and job_queue.full():
+            raise HTTPException(status_code=429, detail="Too many cases are being processed, try again later")
 
-        result = await collection_cases.insert_one(case_data)
-        case_data["id"] = str(result.inserted_id)
-        case_data.pop("_id", None)
-        case_data["timestamp"] = case_data["timestamp"].isoformat()
+        timings = {}
+        temp_file_name, file_id, audio_digest = await track_stage(
+            None, "upload", stream_upload(wavFile, fs, wavFile.filename), timings
+        )
+        PAYLOAD_BYTES.observe(os.path.getsize(temp_file_name), kind="audio")
+        print(f"Saved file to {temp_file_name}")
 
-        return case_data
+        if INGEST_MODE == "async":
+            job = IngestJob(str(ObjectId()), PIPELINE_STAGES)
+            timestamp = datetime.now()
+            # Recorded first, so the job is rerun if the process stops before it is done
+            try:
+                await job_store.add(
+                    job,
+                    temp_file_name=temp_file_name,
+                    file_id=str(file_id),
+                    audio_digest=audio_digest,
+                    timings=timings,
+                    source=source,
+                    type=type,
+                    timestamp=timestamp,
+                )
+                job_queue.submit(job, temp_file_name, file_id, audio_digest, timings, source, type, timestamp)
+            except Exception as e:
+                remove_file(temp_file_name)
+                await fs.delete(file_id)
+                await job_store.remove(job.case_id)
+                if isinstance(e, asyncio.QueueFull):
+                    raise HTTPException(status_code=429, detail="Too many cases are being processed, try again later")
+                raise
+            return {"id": job.case_id, "status": job.status}
+
+        return await process_staged_upload(temp_file_name, file_id, audio_digest, timings, source, type, datetime.now())
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cases/batch", response_model=CaseBatchResult)
+async def create_cases_batch(
+    source: str = Form(...),
+    type: str = Form(...),
+    files: List[UploadFile] = File(...),
+):
+    """
+    Ingest many recordings at once: WAV files and/or zip and tar archives of
+    them, which are read entry by entry without being extracted.
+
+    Entries are uploaded one after the other while up to BATCH_CONCURRENCY
+    earlier ones go through the pipeline, so transcription of one file
+    overlaps scoring and summarization of others, and their NER and
+    lemmatization calls share batches. Finished cases are stored with
+    insert_many. Answers with a manifest of what happened to every file.
+    """
+    manifest = []
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def on_inserted(case_data, inserted_id, context):
+        entry, file_id, after_insert = context
+        case = await after_insert(inserted_id)
+        CASES.inc(outcome="completed")
+        entry.update(status="completed", id=case["id"], severity=case["severity"], riskScore=case["riskScore"])
+
+    async def on_failed(case_data, error, context):
+        entry, file_id, _ = context
+        CASES.inc(outcome="failed")
+        entry.update(status="failed", error=error)
+        await fs.delete(file_id)
+
+    inserter = CaseInserter(collection_cases, on_inserted, on_failed, batch_size=BATCH_INSERT_SIZE)
+
+    async def process_entry(entry, temp_file_name, file_id, audio_digest, timings):
+        try:
+            case_data, after_insert = await analyze_case(
+                temp_file_name, file_id, audio_digest, timings, source, type, datetime.now()
+            )
+            await inserter.add(case_data, (entry, file_id, after_insert))
+        except Exception as e:
+            print(f"Batch entry {entry['file']} failed: {e}")
+            CASES.inc(outcome="failed")
+            await fs.delete(file_id)
+            entry.update(status="failed", error=str(e))
+        finally:
+            remove_file(temp_file_name)
+            slots.release()
+
+    async def read_upload(upload: UploadFile):
+        async for name, reader in iter_upload_entries(upload):
+            entry = {"file": name}
+            manifest.append(entry)
+            if reader is None:
+                entry.update(status="skipped", error="Not a WAV file")
+                continue
+            if len(tasks) >= BATCH_MAX_FILES:
+                entry.update(status="skipped", error=f"More than {BATCH_MAX_FILES} files in one batch")
+                continue
+            await slots.acquire()
+            try:
+                timings = {}
+                temp_file_name, file_id, audio_digest = await track_stage(
+                    None, "upload", stream_upload(reader, fs, os.path.basename(name)), timings
+                )
+            except Exception as e:
+                slots.release()
+                entry.update(status="failed", error=f"Upload failed: {e}")
+                continue
+            PAYLOAD_BYTES.observe(os.path.getsize(temp_file_name), kind="audio")
+            entry["status"] = "processing"
+            tasks.append(asyncio.create_task(process_entry(entry, temp_file_name, file_id, audio_digest, timings)))
+
+    tasks = []
+    try:
+        for upload in files:
+            try:
+                await read_upload(upload)
+            except Exception as e:
+                # A corrupt archive stops only its own upload; what was read from it so far is still processed
+                print(f"Error reading {upload.filename}: {e}")
+                manifest.append({"file": upload.filename or "upload", "status": "failed", "error": f"Could not read archive: {e}"})
+    finally:
+        await asyncio.gather(*tasks)
+        await inserter.flush()
+
+    counts = {status: sum(entry["status"] == status for entry in manifest) for status in ("completed", "failed", "skipped")}
+    return {"total": len(manifest), **counts, "files": manifest}
+
+@app.get("/cases/{case_id}/status", response_model=CaseStatus)
+async def get_case_status(case_id: str):
+    if not ObjectId.is_valid(case_id):
+        raise HTTPException(status_code=400, detail="Invalid case ID format")
+
+    job = job_queue.get(case_id)
+    if job:
+        return job.to_dict()
+
+    try:
+        case = await collection_cases.find_one({"_id": ObjectId(case_id)}, {"_id": 1})
+        # Jobs from before a restart, and failed ones no longer held in memory
+        record = None if case else await job_store.get(case_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving case status: {str(e)}")
+    if case is not None:
+        return {"id": case_id, "status": "completed"}
+    if record is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return {
+        "id": case_id,
+        "status": record["status"],
+        "error": record.get("error"),
+        "created": record.get("created"),
+        "updated": record.get("updated"),
+    }
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/cases/{case_id}/summary/stream")
+async def stream_case_summary(case_id: str, regenerate: bool = False):
+    """
+    Server-sent events with the summary of a case as it is produced: "partial"
+    events with chunk summaries of long transcripts, "summary" events with the
+    final summary so far, then "done". Follows the summary stage of a queued
+    case; for a stored case, sends the stored summary, or summarizes the
+    transcript again with `regenerate=true` and saves the result.
+    """
+    if not ObjectId.is_valid(case_id):
+        raise HTTPException(status_code=400, detail="Invalid case ID format")
+
+    job = job_queue.get(case_id)
+    if job and job.status != "completed":
+        async def follow_job():
+            async for event, data in job.follow_summary():
+                yield sse_event(event, data)
+            if job.status == "failed":
+                yield sse_event("error", {"detail": job.error})
+            else:
+                yield sse_event("done", {"summary": job.summary})
+        return StreamingResponse(follow_job(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    try:
+        case = await collection_cases.find_one({"_id": ObjectId(case_id)}, {"script": 1, "summary": 1})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving case: {str(e)}")
+    if case is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+
+    async def summarize_case():
+        if not regenerate:
+            yield sse_event("done", {"summary": case.get("summary", "")})
+            return
+        progress = asyncio.Queue()
+        task = asyncio.create_task(
+            summarize_text_async(case.get("script", ""), on_progress=lambda *item: progress.put_nowait(item))
+        )
+        task.add_done_callback(lambda _: progress.put_nowait(None))
+        try:
+            while (item := await progress.get()) is not None:
+                yield sse_event(*item)
+            summary = task.result()
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        finally:
+            task.cancel()
+        await collection_cases.update_one({"_id": case["_id"]}, {"$set": {"summary": summary}})
+        yield sse_event("done", {"summary": summary})
+
+    return StreamingResponse(summarize_case(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/cases/live")
+async def analyze_live_call(
+    websocket: WebSocket,
+    sampleRate: int = 16000,
+    sampleWidth: int = 2,
+    channels: int = 1,
+):
+    """
+    Real-time analysis of a call. The client sends raw PCM audio as binary
+    messages (format given in the query string) and the text "end" when the
+    call is over. Every transcribed segment is scored on arrival and answered
+    with an "update" message holding the running score, categories and
+    phrases; a "final" message follows the last segment.
+    """
+    await websocket.accept()
+    audio = LiveAudioBuffer(
+        sample_rate=sampleRate,
+        sample_width=sampleWidth,
+        channels=channels,
+        window_ms=int(os.getenv("LIVE_WINDOW_MS", "5000")),
+        max_window_ms=int(os.getenv("LIVE_MAX_WINDOW_MS", "15000")),
+    )
+    scorer = StreamingScorer()
+    segments = asyncio.Queue()
+
+    # Segments are transcribed and scored in order while more audio is received
+    async def analyze_segments():
+        transcript = []
+        while (segment := await segments.get()) is not None:
+            start, end, pcm = segment
+            text = await worker_pool.run("transcribe", transcribe_pcm, pcm, sampleRate, sampleWidth, channels)
+            transcript.append(text)
+            update = scorer.apply(await worker_pool.run("score", score_segment, text, scorer.carry))
+            await websocket.send_json({
+                "type": "update",
+                "start": start / 1000,
+                "end": end / 1000,
+                "text": text,
+                "severity": determine_severity(update["score"]),
+                **update,
+            })
+        await websocket.send_json({
+            "type": "final",
+            "script": " ".join(part for part in transcript if part),
+            "score": scorer.score,
+            "severity": determine_severity(scorer.score),
+            "categories": scorer.categories,
+            "phrases": scorer.phrases,
+        })
+
+    analyzer = asyncio.create_task(analyze_segments())
+    try:
+        while True:
+            message = await websocket.receive()
+            if analyzer.done():
+                analyzer.result()  # Surfaces a failed segment
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                for segment in audio.feed(message["bytes"]):
+                    segments.put_nowait(segment)
+            elif message.get("text") == "end":
+                break
+        if (rest := audio.flush()) is not None:
+            segments.put_nowait(rest)
+        segments.put_nowait(None)
+        await analyzer
+        await websocket.close()
+    except WebSocketDisconnect:
+        analyzer.cancel()
+    except Exception as e:
+        analyzer.cancel()
+        print(f"Live analysis failed: {e}")
+        await websocket.close(code=1011, reason=str(e)[:120])
+
 @app.delete("/cases/{case_id}")
 async def delete_case(case_id: str):
     try:
@@ -211,6 +841,8 @@ async def delete_case(case_id: str):
 
         result = await collection_cases.delete_one({"_id": ObjectId(case_id)})
         if result.deleted_count == 1:
+            stats_cache.invalidate()
+            await collection_users.update_many({"cases": case_id}, {"$pull": {"cases": case_id}})
             return {"message": "Case deleted successfully"}
         else:
             raise HTTPException(status_code=404, detail="Case not found")
@@ -234,11 +866,20 @@ async def update_case(case_id: str, body: Request):
         )
 
         if result.modified_count == 1:
+            stats_cache.invalidate()
             return {"message": "Case updated successfully"}
         raise HTTPException(status_code=404, detail="Case not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating case: {str(e)}")
 
+@app.get("/stats")
+async def get_stats(days: int = Query(30, ge=1, le=365)):
+    """Dashboard counters, risk-score histogram and per-day trends for the last `days` days."""
+    try:
+        return await stats_cache.get(days, lambda: compute_stats(collection_cases, collection_users, days))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing stats: {str(e)}")
+
 # Users Endpoints
 @app.get("/watchlist")
 async def get_users():
@@ -262,11 +903,13 @@ async def create_user(
         "name": name,
         "phoneNumber": phoneNumber,
         "riskLevel": riskLevel,
-        "lastMentioned": datetime(1, 1, 1)
+        "lastMentioned": datetime(1, 1, 1),
+        "cases": [],
     }
 
     try:
         result = await collection_users.insert_one(user_data)
+        watchlist_index.add(str(result.inserted_id), name, phoneNumber)
         user_data["id"] = str(result.inserted_id)
         user_data.pop("_id", None)
     except Exception as e:
@@ -281,6 +924,7 @@ async def delete_user(user_id: str):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
 
         result = await collection_users.delete_one({"_id": ObjectId(user_id)})
+        watchlist_index.remove(user_id)
         if result.deleted_count == 1:
             return {"message": "User deleted successfully"}
         else:
@@ -288,13 +932,33 @@ async def delete_user(user_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting user: {str(e)}")
 
+@app.get("/badwords/expansion")
+async def get_expansion_stats():
+    return related_words_expander.stats()
+
+@app.post("/badwords/rescore")
+async def start_rescoring():
+    """
+    Re-score stored cases against the current lexicon in the background,
+    resuming an interrupted run if the lexicon hasn't changed since. Answers
+    with the run's progress; GET follows it.
+    """
+    try:
+        return await rescorer.start()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting re-scoring: {str(e)}")
+
+@app.get("/badwords/rescore")
+async def get_rescoring_status():
+    try:
+        return await rescorer.status()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving re-scoring status: {str(e)}")
+
 @app.get("/badwords")
 async def get_badwords():
     try:
-        with open('model/suspicious_words.csv', 'r', encoding='utf-8') as file:
-            file.readline()  # Skip header
-            badwords = ''.join(line.rstrip() + '\n' for line in file if line.strip())
-            badwords = badwords.rstrip()
+        badwords = '\n'.join(f"{row.phrase},{row.category},{row.score}" for row in get_lexicon().rows())
         return {"badwords": badwords}
     except Exception as e:
         raise HTTPException(status_code=500, detail="An error occurred while retrieving bad words")
@@ -303,27 +967,18 @@ async def get_badwords():
 @app.post("/badwords/add")
 async def add_badwords(new_badwords: BadWordsUpdate):
     try:
-        with open('model/suspicious_words.csv', 'a', encoding='utf-8') as file:
-            file.write(f"{new_badwords.word},{new_badwords.category},{new_badwords.score}\n")
+        await asyncio.to_thread(get_lexicon().add, new_badwords.word, new_badwords.category, new_badwords.score)
         return {"message": "Bad word added successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while adding bad word: {str(e)}")
 
 @app.post("/badwords/update/{id}")
 async def update_badwords(id: int, data: BadWordsUpdate):
-    try:        
-        with open('model/suspicious_words.csv', 'r', encoding='utf-8') as file:
-            badwords = file.readlines()
-
-        if id < 0 or id >= len(badwords):
-            raise HTTPException(status_code=404, detail="Bad word not found")
-
-        badwords[id] = f"{data.word},{data.category},{data.score}\n"
-
-        with open('model/suspicious_words.csv', 'w', encoding='utf-8') as file:
-            file.writelines(badwords)
-
+    try:
+        await asyncio.to_thread(get_lexicon().update, id, data.word, data.category, data.score)
         return {"message": "Bad word updated successfully"}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Bad word not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while updating bad word: {str(e)}")
 
@@ -331,17 +986,9 @@ async def update_badwords(id: int, data: BadWordsUpdate):
 @app.delete("/badwords/delete/{id}")
 async def delete_badwords(id: int):
     try:
-        with open('model/suspicious_words.csv', 'r', encoding='utf-8') as file:
-            badwords = file.readlines()
-
-        if id < 0 or id >= len(badwords):
-            raise HTTPException(status_code=404, detail="Bad word not found")
-
-        del badwords[id]
-
-        with open('model/suspicious_words.csv', 'w', encoding='utf-8') as file:
-            file.writelines(badwords)
-
+        await asyncio.to_thread(get_lexicon().delete, id)
         return {"message": "Bad word deleted successfully"}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Bad word not found")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred while deleting bad word: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred while deleting bad word: {str(e)}")
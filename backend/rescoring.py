@@ -0,0 +1,196 @@
+import asyncio
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from model.matches import score_matches
+from model.metrics import counter
+
+from .cache import ResultCache, text_digest
+from .workers import WorkerPool, get_lexicon, rescore_matches, tokenize_texts, tokenizer_version
+
+RESCORED = counter("traceflow_rescored_cases_total", "Stored cases brought up to date with the lexicon, by outcome", ("outcome",))
+
+CHECKPOINT_ID = "rescore"
+RESCORE_PROJECTION = {"script": 1, "lexiconVersion": 1, "lexiconMatches": 1}
+COUNTS = ("scanned", "rescored", "stamped", "tokenized")
+
+
+def _public(state: dict) -> dict:
+    return {**state, "after": str(state["after"]) if state.get("after") is not None else None}
+
+
+class Rescorer:
+    """
+    Re-scores stored cases after lexicon edits, one run at a time.
+
+    Cases whose `lexiconVersion` differs from the lexicon's are read in _id
+    order, `batch_size` at a time and with a projection. Their lemmatized
+    transcripts come from the result cache, so Stanza only runs for
+    transcripts missing from it. When the change log still reaches back to a
+    case's version, only the matches of the phrases changed since then are
+    redone; otherwise the case is matched from scratch. Every case read gets
+    the new version: when nothing changed since its version, or its matches
+    came out the same, that is all that is written. Each batch is written with one
+    bulk_write and the last _id done is checkpointed, so an interrupted run
+    resumes where it stopped unless the lexicon changed in the meantime.
+    """
+
+    def __init__(self, cases: AsyncIOMotorCollection, checkpoints: AsyncIOMotorCollection,
+                 result_cache: Optional[ResultCache], worker_pool: WorkerPool, severity: Callable[[int], str],
+                 batch_size=100, on_batch: Optional[Callable[[], None]] = None):
+        self.cases = cases
+        self.checkpoints = checkpoints
+        self.result_cache = result_cache
+        self.worker_pool = worker_pool
+        self.severity = severity
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self._task: Optional[asyncio.Task] = None
+        self._state = None
+
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def status(self) -> dict:
+        """Progress of the current or last run, from the checkpoint if none ran in this process."""
+        state = self._state
+        if state is None:
+            state = await self.checkpoints.find_one({"_id": CHECKPOINT_ID}, {"_id": 0})
+            if state is None:
+                return {"status": "idle"}
+        return _public(state)
+
+    async def start(self) -> dict:
+        """Start a run against the current lexicon, resuming an unfinished one for the same version."""
+        if self.running():
+            return _public(self._state)
+        lexicon = get_lexicon()
+        await asyncio.to_thread(lexicon.refresh)
+        target = lexicon.version
+        checkpoint = await self.checkpoints.find_one({"_id": CHECKPOINT_ID})
+        resume = checkpoint if (
+            checkpoint and checkpoint.get("lexiconVersion") == target and checkpoint.get("status") != "completed"
+        ) else None
+
+        self._state = {
+            "status": "running",
+            "lexiconVersion": target,
+            "after": resume.get("after") if resume else None,
+            "started": resume["started"] if resume else datetime.now(),
+            "updated": datetime.now(),
+            "finished": None,
+            "error": None,
+            **{name: resume.get(name, 0) if resume else 0 for name in COUNTS},
+        }
+        await self._save_checkpoint()
+        self._task = asyncio.create_task(self._run())
+        return _public(self._state)
+
+    async def resume_interrupted(self):
+        """Restart a run that was still going when the process stopped."""
+        checkpoint = await self.checkpoints.find_one({"_id": CHECKPOINT_ID}, {"status": 1})
+        if checkpoint and checkpoint.get("status") == "running":
+            await self.start()
+
+    async def stop(self):
+        # The checkpoint still says "running", so the run is resumed on the next start
+        if self.running():
+            self._task.cancel()
+
+    async def _save_checkpoint(self):
+        self._state["updated"] = datetime.now()
+        await self.checkpoints.update_one({"_id": CHECKPOINT_ID}, {"$set": self._state}, upsert=True)
+
+    async def _run(self):
+        try:
+            target = self._state["lexiconVersion"]
+            tokenizer = await self.worker_pool.run("score", tokenizer_version) if self.result_cache else None
+            changes = {}  # Changed phrases since each case version seen, None when the log doesn't go back that far
+            query = {"lexiconVersion": {"$ne": target}}
+            while True:
+                if self._state["after"] is not None:
+                    query["_id"] = {"$gt": self._state["after"]}
+                # A fresh query per batch, so slow batches can't time out a long-lived cursor
+                cursor = self.cases.find(query, RESCORE_PROJECTION).sort("_id", 1).limit(self.batch_size)
+                cases = await cursor.to_list(length=self.batch_size)
+                if not cases:
+                    break
+                await self._rescore_batch(cases, target, tokenizer, changes)
+                self._state["after"] = cases[-1]["_id"]
+                self._state["scanned"] += len(cases)
+                await self._save_checkpoint()
+                if self.on_batch:
+                    self.on_batch()
+            self._state.update(status="completed", finished=datetime.now())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Re-scoring failed: {e}")
+            self._state.update(status="failed", error=str(e))
+        await self._save_checkpoint()
+
+    async def _rescore_batch(self, cases: List[dict], target: int, tokenizer: Optional[str], changes: dict):
+        lexicon = get_lexicon()
+        operations = []
+        pending = []
+        rescored = 0
+        for case in cases:
+            version, matches = case.get("lexiconVersion"), case.get("lexiconMatches")
+            changed = None
+            if version is not None and matches is not None:
+                if version not in changes:
+                    changes[version] = await asyncio.to_thread(lexicon.changed_phrases, version)
+                changed = changes[version]
+            if changed is not None and not changed:
+                operations.append(UpdateOne({"_id": case["_id"]}, {"$set": {"lexiconVersion": target}}))
+                continue
+            pending.append((case, matches or [], changed))
+
+        if pending:
+            sentences = await self._sentences([case.get("script", "") for case, _, _ in pending], tokenizer)
+            results = await self.worker_pool.run("score", rescore_matches, [
+                (case_sentences, matches, changed)
+                for case_sentences, (_, matches, changed) in zip(sentences, pending)
+            ])
+            for (case, old_matches, changed), matches in zip(pending, results):
+                if changed is not None and matches == old_matches:
+                    operations.append(UpdateOne({"_id": case["_id"]}, {"$set": {"lexiconVersion": target}}))
+                    continue
+                rescored += 1
+                score, flagged_keywords, categories = score_matches(matches)
+                operations.append(UpdateOne({"_id": case["_id"]}, {"$set": {
+                    "riskScore": score,
+                    "severity": self.severity(score),
+                    "flaggedKeywords": flagged_keywords,
+                    "reason": categories,
+                    "lexiconMatches": matches,
+                    "lexiconVersion": target,
+                }}))
+
+        if operations:
+            await self.cases.bulk_write(operations, ordered=False)
+        stamped = len(operations) - rescored
+        self._state["rescored"] += rescored
+        self._state["stamped"] += stamped
+        RESCORED.inc(rescored, outcome="rescored")
+        RESCORED.inc(stamped, outcome="stamped")
+
+    async def _sentences(self, texts: List[str], tokenizer: Optional[str]):
+        """Lemmatized sentences of the transcripts, from the result cache where possible."""
+        digests = [text_digest(text) for text in texts]
+        cached = {}
+        if self.result_cache:
+            cached = await self.result_cache.get_stages_many(set(digests), {"sentences": tokenizer})
+        sentences = [cached.get(digest, {}).get("sentences") for digest in digests]
+        missing = [i for i, value in enumerate(sentences) if value is None]
+        if missing:
+            tokenized, version = await self.worker_pool.run("score", tokenize_texts, [texts[i] for i in missing])
+            for i, value in zip(missing, tokenized):
+                sentences[i] = value
+                if self.result_cache:
+                    await self.result_cache.put_stages(digests[i], {"sentences": version}, {"sentences": value})
+            self._state["tokenized"] += len(missing)
+        return sentences
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Hashable
+
+RISK_BUCKETS = list(range(0, 101, 10))
+
+
+class TTLCache:
+    """Small in-process cache whose entries expire after `ttl` seconds or on invalidate()."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, tuple] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable]):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        async with self._lock:
+            # Another request may have filled the entry while we waited
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            value = await compute()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+def _counts(groups) -> Dict[str, int]:
+    return {str(group["_id"]): group["count"] for group in groups}
+
+
+def case_stats_pipeline(since: datetime):
+    """Single aggregation computing every dashboard counter over collection_cases."""
+    def count_by(field):
+        return [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+
+    return [
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "bySeverity": count_by("severity"),
+            "byStatus": count_by("status"),
+            "byType": count_by("type"),
+            "riskHistogram": [
+                {"$bucket": {
+                    "groupBy": "$riskScore",
+                    "boundaries": RISK_BUCKETS,
+                    "default": "other",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "daily": [
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$group": {
+                    "_id": {
+                        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                        "status": "$status",
+                    },
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"_id.day": 1}},
+            ],
+        }},
+    ]
+
+
+async def compute_stats(collection_cases, collection_users, days: int):
+    since = datetime.now() - timedelta(days=days)
+    facets, tracked_individuals = await asyncio.gather(
+        collection_cases.aggregate(case_stats_pipeline(since)).to_list(length=1),
+        collection_users.count_documents({}),
+    )
+    facets = facets[0]
+
+    histogram = []
+    buckets = {group["_id"]: group["count"] for group in facets["riskHistogram"]}
+    for low, high in zip(RISK_BUCKETS, RISK_BUCKETS[1:]):
+        histogram.append({"min": low, "max": high, "count": buckets.get(low, 0)})
+
+    daily = {}
+    for group in facets["daily"]:
+        day = daily.setdefault(group["_id"]["day"], {"date": group["_id"]["day"], "total": 0, "byStatus": {}})
+        day["total"] += group["count"]
+        day["byStatus"][str(group["_id"].get("status"))] = group["count"]
+
+    by_severity = _counts(facets["bySeverity"])
+    return {
+        "total": facets["total"][0]["count"] if facets["total"] else 0,
+        "highRisk": by_severity.get("high", 0),
+        "trackedIndividuals": tracked_individuals,
+        "bySeverity": by_severity,
+        "byStatus": _counts(facets["byStatus"]),
+        "byType": _counts(facets["byType"]),
+        "riskHistogram": histogram,
+        "daily": list(daily.values()),
+    }
@@ -1,8 +1,14 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 # Pydantic Models
+class TranscriptSegment(BaseModel):
+    start: Optional[float] = None  # Seconds from the start of the call
+    end: Optional[float] = None
+    text: str = ""
+    error: Optional[str] = None
+
 class CaseBase(BaseModel):
     source: str
     severity: Optional[str] = 'Medium'
@@ -13,20 +19,41 @@ class CaseBase(BaseModel):
     flaggedKeywords: List[str] = []
     reason: List[str] = []
     script: str
+    segments: List[TranscriptSegment] = []
+    transcriptionErrors: List[TranscriptSegment] = []
     summary: str
     duration: str
     related_entities: List[str]
+    watchlistMatches: List[str] = []
+    lexiconVersion: Optional[int] = None
     wav_file_id: str
+    timings: Dict[str, float] = {}
 
 class Case(CaseBase):
     id: str  # Include MongoDB ObjectId as a string
 
+class CaseListItem(CaseBase):
+    id: str
+    script: Optional[str] = None
+    summary: Optional[str] = None
+
+class CaseJob(BaseModel):
+    id: str
+    status: str
+
+class CaseStatus(CaseJob):
+    stages: Dict[str, str] = {}
+    error: Optional[str] = None
+    created: Optional[datetime] = None
+    updated: Optional[datetime] = None
+
 class UserBase(BaseModel):
     user_id: str
     name: str
     phoneNumber: str
     riskLevel: Optional[str] = "medium"
     lastMentioned: datetime
+    cases: List[str] = []
 
 class User(UserBase):
     id: str  # Include MongoDB ObjectId as a string
@@ -35,3 +62,18 @@ class BadWordsUpdate(BaseModel):
     word: str
     category: str
     score: int
+
+class CaseBatchEntry(BaseModel):
+    file: Optional[str] = None
+    status: str
+    id: Optional[str] = None
+    severity: Optional[str] = None
+    riskScore: Optional[float] = None
+    error: Optional[str] = None
+
+class CaseBatchResult(BaseModel):
+    total: int
+    completed: int
+    failed: int
+    skipped: int
+    files: List[CaseBatchEntry]
@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import os
+from tempfile import NamedTemporaryFile
+from typing import Tuple
+
+import aiofiles
+from bson import ObjectId
+from fastapi import UploadFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_BUFFER_CHUNKS = 8
+
+
+async def stream_upload(
+    upload: UploadFile,
+    fs: AsyncIOMotorGridFSBucket,
+    filename: str,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    buffer_chunks: int = UPLOAD_BUFFER_CHUNKS,
+) -> Tuple[str, ObjectId, str]:
+    """
+    Tee an incoming upload into GridFS and a local temp file as it is received.
+
+    At most `buffer_chunks` chunks wait for GridFS at any time, so a slow
+    database slows the upload down instead of piling it up in memory. Returns
+    the temp file path, the GridFS file id and the SHA-256 of the content. On
+    failure neither file is left behind.
+    """
+    grid_in = fs.open_upload_stream(filename)
+    pending = asyncio.Queue(maxsize=buffer_chunks)
+
+    async def write_to_gridfs():
+        while (chunk := await pending.get()) is not None:
+            await grid_in.write(chunk)
+
+    digest = hashlib.sha256()
+    gridfs_writer = asyncio.create_task(write_to_gridfs())
+    with NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+        temp_file_name = temp_file.name
+    try:
+        async with aiofiles.open(temp_file_name, 'wb') as out_file:
+            while chunk := await upload.read(chunk_size):
+                await out_file.write(chunk)
+                digest.update(chunk)
+                # Blocks while GridFS is behind; surfaces GridFS errors early
+                put = asyncio.ensure_future(pending.put(chunk))
+                await asyncio.wait([put, gridfs_writer], return_when=asyncio.FIRST_COMPLETED)
+                if gridfs_writer.done():
+                    put.cancel()
+                    gridfs_writer.result()
+                    raise RuntimeError("GridFS writer stopped early")
+        await pending.put(None)
+        await gridfs_writer
+        await grid_in.close()
+    except BaseException:
+        gridfs_writer.cancel()
+        await asyncio.gather(gridfs_writer, return_exceptions=True)
+        await grid_in.abort()
+        remove_file(temp_file_name)
+        raise
+    return temp_file_name, grid_in._id, digest.hexdigest()
+
+
+async def download_to_temp(fs: AsyncIOMotorGridFSBucket, file_id: ObjectId, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Copy a GridFS file into a new temp file and return its path, e.g. to rerun a job after a restart."""
+    grid_out = await fs.open_download_stream(file_id)
+    with NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+        temp_file_name = temp_file.name
+    try:
+        async with aiofiles.open(temp_file_name, 'wb') as out_file:
+            while chunk := await grid_out.read(chunk_size):
+                await out_file.write(chunk)
+    except BaseException:
+        remove_file(temp_file_name)
+        raise
+    return temp_file_name
+
+
+def remove_file(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
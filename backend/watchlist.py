@@ -0,0 +1,148 @@
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+# One-letter prefixes (and their common combinations) that attach to Hebrew words: ו, ה, ב, כ, ל, מ, ש
+HEBREW_PREFIXES = ("וכש", "וש", "וה", "וב", "ול", "ומ", "וכ", "שה", "שב", "של", "שמ", "מה", "לה", "בה", "כש",
+                   "ו", "ה", "ב", "כ", "ל", "מ", "ש")
+FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+PHONE_PATTERN = re.compile(r"(?:\+?972[-\s]?|0)(?:[-\s]?\d){8,9}")
+# Israeli national significant numbers: eight digits for landlines, nine for mobiles
+PHONE_MIN_DIGITS = 8
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, drop niqqud and punctuation, unify final letters and collapse whitespace."""
+    name = "".join(ch for ch in unicodedata.normalize("NFD", name) if not unicodedata.combining(ch))
+    name = re.sub(r"[^\w\s]", " ", name.lower()).translate(FINAL_LETTERS)
+    return " ".join(name.split())
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """
+    The national significant number: the digits without the +972 country code
+    or the 0 trunk prefix, so "02-6543210" and "+972 2 654 3210" are the same.
+    """
+    digits = re.sub(r"\D", "", phone)
+    for prefix in ("00972", "972", "0"):
+        if digits.startswith(prefix):
+            digits = digits[len(prefix):]
+            break
+    return digits if len(digits) >= PHONE_MIN_DIGITS else None
+
+
+def name_variants(name: str) -> List[str]:
+    """A normalized name, plus the forms with a Hebrew prefix stripped from its first word."""
+    normalized = normalize_name(name)
+    variants = [normalized]
+    for prefix in HEBREW_PREFIXES:
+        if normalized.startswith(prefix) and len(normalized.split(" ", 1)[0]) - len(prefix) >= 2:
+            variants.append(normalized[len(prefix):])
+    return variants
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class WatchlistIndex:
+    """
+    In-memory index of watchlist users by normalized name and phone number.
+
+    Names match exactly after normalization and Hebrew prefix stripping, or
+    fuzzily when their character trigrams are similar enough (Dice coefficient
+    of at least `fuzzy_threshold`). Lookups cost one dictionary probe per
+    variant plus a walk over the postings of the query's trigrams, so matching a
+    case is proportional to its entities rather than the size of the watchlist.
+    """
+
+    def __init__(self, fuzzy_threshold=0.8):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._names: Dict[str, Set[str]] = defaultdict(set)
+        self._phones: Dict[str, Set[str]] = defaultdict(set)
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._users: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def load(self, users: Iterable[dict]):
+        """Replace the index with `users`, given as watchlist documents."""
+        with self._lock:
+            self._names.clear()
+            self._phones.clear()
+            self._trigrams.clear()
+            self._users.clear()
+        for user in users:
+            self.add(str(user["_id"]), user.get("name", ""), user.get("phoneNumber", ""))
+
+    def add(self, user_id: str, name: str, phone_number: str = ""):
+        key = normalize_name(name)
+        phone = normalize_phone(phone_number or "")
+        with self._lock:
+            self._remove_locked(user_id)
+            self._users[user_id] = (key, phone)
+            if key:
+                self._names[key].add(user_id)
+                for trigram in _trigrams(key):
+                    self._trigrams[trigram].add(key)
+            if phone:
+                self._phones[phone].add(user_id)
+
+    def remove(self, user_id: str):
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def _remove_locked(self, user_id: str):
+        key, phone = self._users.pop(user_id, (None, None))
+        if key:
+            self._names[key].discard(user_id)
+            if not self._names[key]:
+                del self._names[key]
+                for trigram in _trigrams(key):
+                    self._trigrams[trigram].discard(key)
+                    if not self._trigrams[trigram]:
+                        del self._trigrams[trigram]
+        if phone:
+            self._phones[phone].discard(user_id)
+            if not self._phones[phone]:
+                del self._phones[phone]
+
+    def _fuzzy_keys(self, variant: str) -> List[str]:
+        query = _trigrams(variant)
+        overlap = Counter(key for trigram in query for key in self._trigrams.get(trigram, ()))
+        return [
+            key for key, shared in overlap.items()
+            if 2 * shared / (len(query) + len(_trigrams(key))) >= self.fuzzy_threshold
+        ]
+
+    def match_name(self, name: str) -> Set[str]:
+        """Ids of the users whose name matches `name`."""
+        variants = name_variants(name)
+        with self._lock:
+            for variant in variants:
+                if variant in self._names:
+                    return set(self._names[variant])
+            matches = set()
+            for variant in variants:
+                for key in self._fuzzy_keys(variant):
+                    matches |= self._names[key]
+            return matches
+
+    def match_phone(self, phone_number: str) -> Set[str]:
+        phone = normalize_phone(phone_number)
+        with self._lock:
+            return set(self._phones.get(phone, ())) if phone else set()
+
+    def match(self, names: Iterable[str], text: str = "") -> Set[str]:
+        """Ids of the users mentioned by any of `names` or by a phone number in `text`."""
+        matches = set()
+        for name in names:
+            matches |= self.match_name(name)
+        for phone_number in PHONE_PATTERN.findall(text):
+            matches |= self.match_phone(phone_number)
+        return matches
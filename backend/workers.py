@@ -0,0 +1,308 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from math import floor
+
+from mutagen.wave import WAVE
+
+from model.lexicon import LexiconStore
+from model.matches import merge_matches
+
+BINARY_FILE_PATH = "model/words2vec.bin"
+LEXICON_PATH = "model/suspicious_words.csv"
+
+# Stages that need the models or burn CPU in Python
+CPU_STAGES = ("duration", "transcribe", "ner", "score", "expand")
+
+# Models owned by the current process: the API process in thread mode, each worker in process mode.
+# They are loaded on first use (or by warm-up), so importing this module stays cheap.
+_models = {}
+_model_status = {"detector": "not_loaded", "ner": "not_loaded"}
+_model_load_seconds = {}
+_model_locks = {"detector": threading.Lock(), "ner": threading.Lock()}
+_lexicon = None
+
+
+def _build_detector():
+    from model.score import SuspiciousWordDetector
+
+    return SuspiciousWordDetector(
+        binary_file_path=BINARY_FILE_PATH,
+        max_batch_size=int(os.getenv("STANZA_MAX_BATCH_SIZE", "16")),
+        max_wait_ms=float(os.getenv("STANZA_MAX_WAIT_MS", "10")),
+    )
+
+
+def _build_ner_engine():
+    from model.extract_entities import NEREngine
+
+    threads = os.getenv("NER_THREADS")
+    return NEREngine(
+        max_batch_size=int(os.getenv("NER_MAX_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.getenv("NER_MAX_WAIT_MS", "10")),
+        backend=os.getenv("NER_BACKEND", "fp32"),
+        num_threads=int(threads) if threads else None,
+    )
+
+
+_model_builders = {"detector": _build_detector, "ner": _build_ner_engine}
+
+
+def _get_model(name: str):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _model_locks[name]:
+        if name not in _models:
+            _model_status[name] = "loading"
+            started = time.perf_counter()
+            try:
+                _models[name] = _model_builders[name]()
+            except Exception:
+                _model_status[name] = "failed"
+                raise
+            _model_load_seconds[name] = time.perf_counter() - started
+            _model_status[name] = "loaded"
+    return _models[name]
+
+
+def get_detector():
+    return _get_model("detector")
+
+
+def get_ner_engine():
+    return _get_model("ner")
+
+
+def model_status():
+    """Load state of each model in this process, with load times in seconds."""
+    return {
+        name: {"status": status, "load_seconds": _model_load_seconds.get(name)}
+        for name, status in _model_status.items()
+    }
+
+
+def init_models():
+    """Load the detector and NER engine into this process."""
+    get_detector()
+    get_ner_engine()
+
+
+def get_lexicon() -> LexiconStore:
+    """
+    The lexicon store of this process. Once the detector is loaded in this
+    process it is the detector's own store, so edits reach the phrase index
+    immediately; otherwise (process mode, or before warm-up) a standalone store
+    whose edits reach the detectors through the shared change log.
+    """
+    global _lexicon
+    detector = _models.get("detector")
+    if detector is not None:
+        return detector.lexicon
+    if _lexicon is None:
+        _lexicon = LexiconStore(LEXICON_PATH)
+    return _lexicon
+
+
+# Stage functions. They live at module level so worker processes can unpickle them.
+def get_audio_duration(file_path: str) -> str:
+    audio = WAVE(file_path)
+    return '{:02d}:{:02d}'.format(*divmod(floor(audio.info.length), 60))
+
+
+def transcribe(file_path: str) -> dict:
+    from model.speech_to_text import transcribe_file
+
+    return transcribe_file(file_path)
+
+
+def transcribe_pcm(data: bytes, sample_rate: int, sample_width: int, channels: int) -> str:
+    from model.speech_to_text import transcribe_pcm as transcribe_raw
+
+    return transcribe_raw(data, sample_rate, sample_width, channels)
+
+
+def extract_entities(conversation: str):
+    from model.extract_entities import extract_person_names
+
+    return extract_person_names(conversation, get_ner_engine())
+
+
+def entities_version() -> str:
+    """The NER version of the engine this process actually loaded."""
+    from model.extract_entities import ner_version
+
+    return ner_version(get_ner_engine().backend)
+
+
+def match_text(conversation: str):
+    """
+    Lexicon matches of a transcript and the lexicon version they reflect, plus
+    the lemmatized sentences and tokenizer version for the result cache.
+    """
+    detector = get_detector()
+    detector.refresh()
+    # Read before matching, so an edit made meanwhile is redone by the next re-scoring
+    lexicon_version = detector.lexicon.version
+    sentences = detector.tokenize_many([conversation])[0]
+    scoring = {"matches": detector.match_sentences(sentences), "lexiconVersion": lexicon_version}
+    return scoring, sentences, detector.tokenizer_version
+
+
+def tokenizer_version() -> str:
+    return get_detector().tokenizer_version
+
+
+def tokenize_texts(texts):
+    detector = get_detector()
+    return detector.tokenize_many(texts), detector.tokenizer_version
+
+
+def rescore_matches(items):
+    """
+    Lexicon matches of stored cases against the current lexicon. Items are
+    (sentences, matches, changed phrases); with `changed` None the sentences
+    are matched from scratch, otherwise only the matches of those phrases are
+    redone.
+    """
+    detector = get_detector()
+    detector.refresh()
+    subindexes = {}
+    results = []
+    for sentences, matches, changed in items:
+        if changed is None:
+            results.append(detector.match_sentences(sentences))
+            continue
+        if changed not in subindexes:
+            subindexes[changed] = detector.phrase_subindex(changed)
+        results.append(merge_matches(matches, changed, detector.match_sentences(sentences, subindexes[changed])))
+    return results
+
+
+def score_segment(text: str, carry):
+    detector = get_detector()
+    detector.refresh()
+    return detector.analyze_segment(text, carry)
+
+
+def expand_related_words(keywords):
+    detector = get_detector()
+    detector.refresh()
+    detector.add_related_words(keywords)
+
+
+def _warm_up():
+    return os.getpid(), model_status()
+
+
+class WorkerPool:
+    """
+    Routes pipeline stages to executors.
+
+    In "thread" mode the models are loaded once in the API process and CPU stages
+    share them from a thread pool. In "process" mode every worker process loads
+    its own detector and NER engine, so Python-heavy stages are not serialized on
+    the GIL. The summarizer is natively async and doesn't use the pool.
+
+    Models load lazily on first use; `warm_up()` loads them ahead of time.
+    """
+
+    def __init__(self, mode="thread", cpu_workers=None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown execution mode: {mode}")
+        self.mode = mode
+        self.cpu_workers = cpu_workers or os.cpu_count()
+        self.warmed_up = False
+        self._worker_status = {}
+        # Submitted but unfinished tasks, per stage; cheap enough to keep on all the time
+        self._in_flight = Counter()
+        self._in_flight_lock = threading.Lock()
+        if mode == "process":
+            # Worker processes are spawned on first use and load the models before taking work
+            self.cpu_executor = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_models,
+            )
+        else:
+            self.cpu_executor = ThreadPoolExecutor(max_workers=self.cpu_workers)
+        self.routes = {stage: self.cpu_executor for stage in CPU_STAGES}
+
+    @classmethod
+    def from_env(cls):
+        cpu_workers = os.getenv("CPU_WORKERS")
+        return cls(
+            mode=os.getenv("EXECUTION_MODE", "thread"),
+            cpu_workers=int(cpu_workers) if cpu_workers else None,
+        )
+
+    def warm_up(self):
+        """Load the models: here in thread mode, in every worker process in process mode."""
+        if self.mode == "process":
+            from model.vectors import ensure_mmap_vectors
+
+            # Workers map the same vector file instead of each loading a private copy
+            ensure_mmap_vectors(BINARY_FILE_PATH)
+            futures = [self.cpu_executor.submit(_warm_up) for _ in range(self.cpu_workers)]
+            wait(futures)
+            self._worker_status = dict(future.result() for future in futures)
+        else:
+            init_models()
+        self.warmed_up = True
+
+    def status(self):
+        """Which models are loaded, for the readiness endpoint."""
+        if self.mode == "process":
+            return {"mode": self.mode, "ready": self.warmed_up, "workers": self._worker_status}
+        models = model_status()
+        ready = all(model["status"] == "loaded" for model in models.values())
+        return {"mode": self.mode, "ready": ready, "models": models}
+
+    def model_load_seconds(self):
+        """Model load times per worker (the API process itself in thread mode)."""
+        if self.mode == "process":
+            statuses = self._worker_status
+        else:
+            statuses = {os.getpid(): model_status()}
+        return {
+            (str(pid), name): model["load_seconds"]
+            for pid, models in statuses.items()
+            for name, model in models.items()
+        }
+
+    def executor_stats(self):
+        """Tasks in flight per stage, and how many of them are running or waiting for a worker."""
+        with self._in_flight_lock:
+            in_flight = dict(self._in_flight)
+        total = sum(in_flight.values())
+        return {
+            "workers": self.cpu_workers,
+            "in_flight": in_flight,
+            "active": min(total, self.cpu_workers),
+            "queued": max(0, total - self.cpu_workers),
+        }
+
+    def _done(self, stage: str, _future):
+        with self._in_flight_lock:
+            self._in_flight[stage] -= 1
+
+    def submit(self, stage: str, fn, *args) -> Future:
+        with self._in_flight_lock:
+            self._in_flight[stage] += 1
+        try:
+            future = self.routes[stage].submit(fn, *args)
+        except BaseException:
+            self._done(stage, None)
+            raise
+        future.add_done_callback(lambda future: self._done(stage, future))
+        return future
+
+    async def run(self, stage: str, fn, *args):
+        return await asyncio.wrap_future(self.submit(stage, fn, *args))
+
+    def shutdown(self):
+        self.cpu_executor.shutdown(wait=False, cancel_futures=True)
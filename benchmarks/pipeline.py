@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Sequence
+
+from benchmarks import synthetic
+
+STAGES = ("lexicon_load", "score", "related_words", "ner", "summarize", "transcribe", "gridfs_save")
+
+
+def _percentile(values: Sequence[float], percent: float) -> float:
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def measure(stage: str, fn: Callable, inputs: List, params: dict, unit="calls", concurrency=1) -> dict:
+    """
+    Run `fn` on every input and summarize latencies and throughput. `fn` returns
+    how many `unit`s it processed. Peak memory comes from a separate traced run
+    of the first input, so tracing does not slow down the timed runs.
+    """
+    latencies = []
+    units = 0
+
+    def timed(item):
+        start = time.perf_counter()
+        processed = fn(item)
+        latencies.append((time.perf_counter() - start) * 1000)
+        return processed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        units = sum(executor.map(timed, inputs))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(inputs[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        "stage": stage,
+        "params": params,
+        "runs": len(latencies),
+        "concurrency": concurrency,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies),
+            "max": max(latencies),
+        },
+        "throughput": {"unit": unit, "per_second": units / elapsed if elapsed else None},
+        "peak_traced_memory_mb": peak / 2 ** 20,
+    }
+    print(f"{stage} {params}: p50 {result['latency_ms']['p50']:.1f} ms, "
+          f"{result['throughput']['per_second']:.1f} {unit}/s", file=sys.stderr)
+    return result
+
+
+def _parse_sizes(value: str, kind=int) -> List:
+    return [kind(size) for size in value.split(",") if size]
+
+
+def _build_detector(workdir: str, vectors_path: str, vocabulary, lexicon_size: int, args):
+    from model.score import SuspiciousWordDetector
+
+    lexicon_path = os.path.join(workdir, f"lexicon-{lexicon_size}.csv")
+    phrases = synthetic.write_lexicon(lexicon_path, vocabulary, lexicon_size, seed=args.seed)
+    tokenize_batch = None if args.tokenizer == "stanza" else synthetic.whitespace_tokenize
+    detector = SuspiciousWordDetector(
+        binary_file_path=vectors_path, offline=True, lexicon_path=lexicon_path, tokenize_batch=tokenize_batch,
+    )
+    return detector, phrases
+
+
+def run(args) -> dict:
+    stages = set(args.stages.split(",")) if args.stages else set(STAGES)
+    results = []
+    workdir = tempfile.mkdtemp(prefix="traceflow-bench-")
+    vocabulary = synthetic.make_vocabulary(args.vocabulary_size, seed=args.seed)
+    vectors_path = synthetic.write_vectors(
+        os.path.join(workdir, "words2vec.bin"), vocabulary, dim=args.vector_dim, seed=args.seed
+    )
+    transcript_sizes = _parse_sizes(args.transcript_words)
+    lexicon_sizes = _parse_sizes(args.lexicon_sizes)
+    # Transcripts for the stages that don't depend on the lexicon
+    rng = random.Random(args.seed)
+    sample_phrases = [" ".join(rng.sample(vocabulary, 2)) for _ in range(100)]
+    transcripts = {
+        words: [synthetic.make_transcript(vocabulary, sample_phrases, words, seed=args.seed + i) for i in range(args.runs)]
+        for words in transcript_sizes
+    }
+
+    for lexicon_size in lexicon_sizes if stages & {"lexicon_load", "score", "related_words"} else ():
+        built = []
+
+        def load(_):
+            built.append(_build_detector(workdir, vectors_path, vocabulary, lexicon_size, args))
+            # Keep every load cold
+            lemma_cache = os.path.join(workdir, f"lexicon-{lexicon_size}.lemmas.pkl")
+            if os.path.exists(lemma_cache):
+                os.remove(lemma_cache)
+            return lexicon_size
+
+        if "lexicon_load" in stages:
+            results.append(measure("lexicon_load", load, [None], {"lexicon_entries": lexicon_size}, unit="entries"))
+        detector, phrases = built[0] if built else _build_detector(workdir, vectors_path, vocabulary, lexicon_size, args)
+
+        def score(text):
+            detector.calculate_score(text)
+            return len(text.split())
+
+        def related_words(words):
+            return len(detector.similarity.most_similar_many(words, topn=2))
+
+        if "score" in stages:
+            for words in transcript_sizes:
+                inputs = [
+                    synthetic.make_transcript(vocabulary, phrases, words, seed=args.seed + i) for i in range(args.runs)
+                ]
+                results.append(measure(
+                    "score",
+                    score,
+                    inputs,
+                    {"lexicon_entries": lexicon_size, "transcript_words": words},
+                    unit="words",
+                    concurrency=args.concurrency,
+                ))
+
+        if "related_words" in stages:
+            rng = random.Random(args.seed)
+            inputs = [rng.sample(vocabulary, 20) for _ in range(args.runs)]
+            results.append(measure(
+                "related_words",
+                related_words,
+                inputs,
+                {"lexicon_entries": lexicon_size, "vocabulary": len(vocabulary), "vector_dim": args.vector_dim},
+                unit="words",
+            ))
+
+    if "ner" in stages:
+        from model.extract_entities import NEREngine, extract_person_names
+
+        engine = synthetic.StubNEREngine() if args.ner == "stub" else NEREngine(backend=args.ner)
+
+        def ner(text):
+            extract_person_names(text, engine)
+            return len(text.split())
+
+        for words, inputs in transcripts.items():
+            results.append(measure(
+                "ner",
+                ner,
+                inputs,
+                {"transcript_words": words, "engine": args.ner},
+                unit="words",
+                concurrency=args.concurrency,
+            ))
+
+    if "summarize" in stages:
+        from model import transcript
+
+        transcript._async_client = synthetic.stub_summary_client(args.summary_latency_ms)
+
+        def summarize(text):
+            transcript._semaphore = None  # Bound to the event loop of the previous asyncio.run
+            asyncio.run(transcript.summarize_text_async(text))
+            return len(text.split())
+
+        for words, inputs in transcripts.items():
+            results.append(measure(
+                "summarize",
+                summarize,
+                inputs,
+                {"transcript_words": words, "stub_latency_ms": args.summary_latency_ms},
+                unit="words",
+            ))
+
+    if "transcribe" in stages:
+        from model.speech_to_text import StubBackend, speech_to_text_func
+
+        def transcribe(path):
+            speech_to_text_func(path, chunked=True, backend=StubBackend())
+            return minutes * 60
+
+        for minutes in _parse_sizes(args.audio_minutes, float):
+            path = synthetic.write_audio(os.path.join(workdir, f"call-{minutes}.wav"), minutes, seed=args.seed)
+            results.append(measure(
+                "transcribe",
+                transcribe,
+                [path] * max(1, args.runs // 4),
+                {"audio_minutes": minutes, "backend": "stub", "chunked": True},
+                unit="audio_seconds",
+            ))
+
+    if "gridfs_save" in stages and args.mongo_url:
+        results.extend(_measure_gridfs(args, workdir))
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": vars(args),
+        "results": results,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _measure_gridfs(args, workdir: str) -> List[dict]:
+    from fastapi import UploadFile
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+
+    from backend.uploads import remove_file, stream_upload
+
+    results = []
+    for minutes in _parse_sizes(args.audio_minutes, float):
+        path = synthetic.write_audio(os.path.join(workdir, f"call-{minutes}.wav"), minutes, seed=args.seed)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        def save(_):
+            async def upload():
+                fs = AsyncIOMotorGridFSBucket(AsyncIOMotorClient(args.mongo_url)[args.mongo_db])
+                temp_file_name, file_id, _ = await stream_upload(UploadFile(file=io.BytesIO(data), filename="bench.wav"), fs, "bench.wav")
+                remove_file(temp_file_name)
+                await fs.delete(file_id)
+
+            asyncio.run(upload())
+            return len(data) / 2 ** 20
+
+        results.append(measure(
+            "gridfs_save", save, [None] * max(1, args.runs // 4), {"audio_minutes": minutes}, unit="MB"
+        ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmarks of the case-ingestion pipeline.")
+    parser.add_argument("--stages", default="", help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--lexicon-sizes", default="500,5000,50000")
+    parser.add_argument("--transcript-words", default="500,5000")
+    parser.add_argument("--audio-minutes", default="1,10")
+    parser.add_argument("--runs", type=int, default=20, help="Inputs per measurement")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent callers for score and ner")
+    parser.add_argument("--vocabulary-size", type=int, default=20000)
+    parser.add_argument("--vector-dim", type=int, default=100)
+    parser.add_argument("--tokenizer", choices=("stub", "stanza"), default="stub",
+                        help="stanza needs the Hebrew models in the local cache")
+    parser.add_argument("--ner", choices=("stub", "fp32", "int8", "onnx"), default="stub",
+                        help="The model backends need the NER model in the local Hugging Face cache")
+    parser.add_argument("--summary-latency-ms", type=float, default=0.0, help="Simulated latency of the stub summarizer")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL"), help="Enables gridfs_save")
+    parser.add_argument("--mongo-db", default="benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import csv
+import random
+import re
+import wave
+from types import SimpleNamespace
+from typing import List, Sequence
+
+import numpy as np
+
+HEBREW_LETTERS = "אבגדהוזחטיכלמנסעפצקרשת"
+FINAL_FORMS = {"כ": "ך", "מ": "ם", "נ": "ן", "פ": "ף", "צ": "ץ"}
+CATEGORIES = ["הלבנת הון", "שוחד", "הונאה", "סחר בסמים", "העלמת מס", "לא ידוע"]
+FIRST_NAMES = ["משה", "יוסי", "דני", "אבי", "מיכל", "רונית", "יונתן", "שרה", "עומר", "נועה", "איתי", "רחל"]
+LAST_NAMES = ["כהן", "לוי", "מזרחי", "פרץ", "ביטון", "אברהם", "פרידמן", "אזולאי"]
+
+
+def make_word(rng: random.Random) -> str:
+    word = "".join(rng.choice(HEBREW_LETTERS) for _ in range(rng.randint(2, 7)))
+    return word[:-1] + FINAL_FORMS.get(word[-1], word[-1])
+
+
+def make_vocabulary(size: int, seed=0) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add(make_word(rng))
+    return sorted(vocabulary)
+
+
+def write_lexicon(path: str, vocabulary: Sequence[str], entries: int, seed=0) -> List[str]:
+    """Write a lexicon CSV of 1-3 word phrases drawn from `vocabulary`; returns the phrases."""
+    rng = random.Random(seed)
+    phrases = [" ".join(rng.sample(vocabulary, rng.randint(1, 3))) for _ in range(entries)]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["word", "category", "score"])
+        for phrase in phrases:
+            writer.writerow([phrase, rng.choice(CATEGORIES), rng.randint(5, 100)])
+    return phrases
+
+
+def make_transcript(vocabulary: Sequence[str], phrases: Sequence[str], words: int, phrase_rate=0.02, seed=0) -> str:
+    """
+    A conversation of about `words` words in speaker turns like "name (phone): text",
+    with lexicon phrases mixed in at `phrase_rate` per word.
+    """
+    rng = random.Random(seed)
+    speakers = [
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} (05{rng.randint(0, 9)}-{rng.randint(1000000, 9999999)})"
+        for _ in range(3)
+    ]
+    turns = []
+    written = 0
+    while written < words:
+        sentences = []
+        for _ in range(rng.randint(1, 4)):
+            sentence = []
+            for _ in range(rng.randint(4, 14)):
+                if phrases and rng.random() < phrase_rate:
+                    sentence.append(rng.choice(phrases))
+                elif rng.random() < 0.03:
+                    sentence.append(rng.choice(FIRST_NAMES))
+                else:
+                    # Zipf-like: early words of the vocabulary are much more common
+                    sentence.append(vocabulary[min(len(vocabulary) - 1, int(rng.paretovariate(1.2)) - 1)])
+            written += len(sentence)
+            sentences.append(" ".join(sentence) + rng.choice([".", ".", "?", "!"]))
+        turns.append(f"{rng.choice(speakers)}: {' '.join(sentences)}")
+    return "\n".join(turns)
+
+
+def write_vectors(path: str, vocabulary: Sequence[str], dim=100, seed=0) -> str:
+    """Save random word vectors for `vocabulary` in KeyedVectors format."""
+    from gensim.models import KeyedVectors
+
+    rng = np.random.default_rng(seed)
+    kv = KeyedVectors(vector_size=dim)
+    kv.add_vectors(list(vocabulary), rng.standard_normal((len(vocabulary), dim)).astype(np.float32))
+    kv.save(path)
+    return path
+
+
+def write_audio(path: str, minutes: float, sample_rate=16000, seed=0) -> str:
+    """Mono 16-bit WAV of noisy tone bursts (2-8s) separated by pauses (0.3-1s)."""
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * sample_rate)
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        written = 0
+        while written < total:
+            speech = int(rng.uniform(2, 8) * sample_rate)
+            t = np.arange(speech) / sample_rate
+            burst = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) + 0.05 * rng.standard_normal(speech)
+            pause = 0.002 * rng.standard_normal(int(rng.uniform(0.3, 1.0) * sample_rate))
+            samples = np.concatenate([burst, pause])[:total - written]
+            out.writeframes((samples * 32767).astype(np.int16).tobytes())
+            written += len(samples)
+    return path
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n")
+
+
+def whitespace_tokenize(texts: List[str]):
+    """Stand-in for Stanza: sentences split on punctuation, words on spaces, each word its own lemma."""
+    return [
+        [
+            [(word, word.strip(".,!?:()")) for word in sentence.split()]
+            for sentence in _SENTENCE_END.split(text) if sentence.strip()
+        ]
+        for text in texts
+    ]
+
+
+class StubNEREngine:
+    """Stand-in for NEREngine that tags the synthetic first names as PER."""
+
+    def __init__(self, names=FIRST_NAMES):
+        self.names = set(names)
+
+    def predict(self, sentences):
+        return [
+            [{"word": word, "entity_type": "PER"} for word in sentence.split() if word in self.names]
+            for sentence in sentences
+        ]
+
+
+class StubCompletions:
+    """Stand-in for the Groq chat completions API that streams back a truncated copy of the input."""
+
+    def __init__(self, latency_ms=0.0, chunk_words=8):
+        self.latency_ms = latency_ms
+        self.chunk_words = chunk_words
+
+    async def create(self, messages, max_tokens=1024, **kwargs):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        words = messages[-1]["content"].split()[:max_tokens]
+
+        async def stream():
+            for start in range(0, len(words), self.chunk_words):
+                content = " ".join(words[start:start + self.chunk_words]) + " "
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+        return stream()
+
+
+def stub_summary_client(latency_ms=0.0):
+    return SimpleNamespace(chat=SimpleNamespace(completions=StubCompletions(latency_ms)))
@@ -88,8 +88,8 @@ export default function CaseDetails({ caseData, onClose }: CaseDetailsProps) {
                     factors={mockRiskFactors}
                   />
                   <CallSummary
-                    summary= {caseData.summary}
-                    transcript={caseData.script}
+                    summary= {caseData.summary ?? 'Loading…'}
+                    transcript={caseData.script ?? 'Loading…'}
                     keywords={caseData.flaggedKeywords || []}
                     entities={caseData.related_entities || []}
                     sentiment="negative"
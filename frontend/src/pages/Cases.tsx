@@ -9,6 +9,8 @@ import { toast } from 'sonner';
 import { ClipLoader } from 'react-spinners';
 import { API_BASE_URL } from '../constants';
 
+const CASES_PAGE_SIZE = 500;
+
 const statusCaseStyles = {
   open: 'bg-blue-100 text-blue-800 dark:bg-blue-900 dark:text-blue-200',
   closed: 'bg-gray-100 text-gray-800 dark:bg-gray-700 dark:text-gray-200',
@@ -110,14 +112,25 @@ export default function Cases() {
   const fetchCases = useCallback(async () => {
     setIsLoading(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/cases`, {
-        method: 'GET',
-        mode: 'cors',
-      });
-      if (!response.ok) {
-        throw new Error('Failed to fetch cases');
-      }
-      const data = await response.json();
+      // The API pages its results; follow X-Next-Cursor until the last page.
+      // The list view leaves out transcripts and summaries, which are fetched when a case is opened
+      const data: Case[] = [];
+      let cursor: string | null = null;
+      do {
+        const params = new URLSearchParams({ limit: String(CASES_PAGE_SIZE), view: 'list' });
+        if (cursor) {
+          params.set('cursor', cursor);
+        }
+        const response = await fetch(`${API_BASE_URL}/cases?${params}`, {
+          method: 'GET',
+          mode: 'cors',
+        });
+        if (!response.ok) {
+          throw new Error('Failed to fetch cases');
+        }
+        data.push(...(await response.json()));
+        cursor = response.headers.get('X-Next-Cursor');
+      } while (cursor);
       setCases(data);
       setFilteredCases(data);
     } catch (error) {
@@ -133,6 +146,25 @@ export default function Cases() {
     fetchCases();
   }, [fetchCases]);
 
+  const handleOpenCase = async (row: Case) => {
+    setSelectedCase(row);
+    try {
+      const response = await fetch(`${API_BASE_URL}/cases/${row.id}`, {
+        method: 'GET',
+        mode: 'cors',
+      });
+      if (!response.ok) {
+        throw new Error('Failed to fetch case');
+      }
+      const fullCase: Case = await response.json();
+      setSelectedCase((current) => (current?.id === row.id ? fullCase : current));
+    } catch (error) {
+      toast.error('Failed to fetch case', {
+        description: error instanceof Error ? error.message : 'Unknown error',
+      });
+    }
+  };
+
   const handleAddCase = async (formData: FormData) => {
     setIsAddingCase(true);
     try {
@@ -208,7 +240,7 @@ export default function Cases() {
         <DataTable
           data={filteredCases}
           columns={columns}
-          onRowClick={setSelectedCase}
+          onRowClick={handleOpenCase}
           onDelete={handleDeleteCase}
           onSearch={(query, filters) => {
             const lowerCaseQuery = query.toLowerCase();
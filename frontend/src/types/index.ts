@@ -9,8 +9,9 @@ export interface Case {
   riskScore: number;
   flaggedKeywords: string[];
   reason: string[];
-  summary: string;
-  script: string;
+  // Left out of the case list; loaded from GET /cases/{id}
+  summary?: string;
+  script?: string;
   duration: string;
   related_entities: string[];
 }
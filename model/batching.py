@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+from model.metrics import BATCH_BUCKETS, histogram
+
+BATCH_SIZE = histogram("traceflow_batch_size", "Items per micro-batch", ("batcher",), BATCH_BUCKETS)
+BATCH_SECONDS = histogram("traceflow_batch_seconds", "Time to process one micro-batch", ("batcher",))
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and hands them to `process_batch`
+    in groups of at most `max_batch_size`, waiting at most `max_wait_ms` for a
+    batch to fill up once its first item has arrived. When a batch fails, its
+    items are retried one at a time, so only the item that fails gets the error.
+    """
+
+    def __init__(self, process_batch: Callable[[List], List], max_batch_size=32, max_wait_ms=10.0, name="batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, items: Sequence) -> List[Future]:
+        """Queue items for processing and return one future per item."""
+        if self._closed:
+            raise RuntimeError("Batcher is closed")
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return futures
+
+    def map(self, items: Sequence) -> List:
+        """Process items through the batcher and block until all results are ready."""
+        return [future.result() for future in self.submit(items)]
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Let the loop exit after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while (batch := self._next_batch()) is not None:
+            items = [item for item, _ in batch]
+            BATCH_SIZE.observe(len(items), batcher=self.name)
+            try:
+                with BATCH_SECONDS.time(batcher=self.name):
+                    results = self.process_batch(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_one_by_one(batch)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_one_by_one(self, batch):
+        # One bad item (e.g. a sentence over the model's length limit) must not fail the others it was batched with
+        for item, future in batch:
+            try:
+                future.set_result(self.process_batch([item])[0])
+            except Exception as e:
+                future.set_exception(e)
@@ -0,0 +1,100 @@
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List
+
+
+class RelatedWordsExpander:
+    """
+    Single background worker that grows the lexicon with words similar to flagged keywords.
+
+    Keywords are queued in a bounded queue and handed to `expand` in batches of
+    up to `batch_size`. A keyword is not queued again while it waits or after
+    it was expanded; the `max_seen` most recently expanded keywords are
+    remembered. Keywords whose batch failed, or that were dropped because the
+    queue was full, may be queued again by a later case.
+    """
+
+    def __init__(self, expand: Callable[[List[str]], None], max_queue=1000, batch_size=32, max_seen=10000):
+        self.expand = expand
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.max_seen = max_seen
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._queued = set()  # Waiting or being expanded
+        self._seen = OrderedDict()  # Expanded, least recently submitted first
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "duplicates": 0, "dropped": 0, "expanded": 0, "failed": 0, "batches": 0}
+        self._worker = threading.Thread(target=self._run, name="related-words-expander", daemon=True)
+        self._worker.start()
+
+    def submit(self, keywords: Iterable[str]) -> int:
+        """Queue keywords for expansion without blocking; returns how many were accepted."""
+        accepted = 0
+        with self._lock:
+            for keyword in keywords:
+                self._counters["submitted"] += 1
+                if keyword in self._seen:
+                    self._seen.move_to_end(keyword)
+                    self._counters["duplicates"] += 1
+                    continue
+                if keyword in self._queued:
+                    self._counters["duplicates"] += 1
+                    continue
+                try:
+                    self._queue.put_nowait(keyword)
+                except queue.Full:
+                    self._counters["dropped"] += 1
+                    continue
+                self._queued.add(keyword)
+                accepted += 1
+        return accepted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "expanded_keywords": len(self._seen),
+                "max_seen": self.max_seen,
+                **self._counters,
+            }
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                keyword = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if keyword is None:
+                self._queue.put(None)
+                break
+            batch.append(keyword)
+        return batch
+
+    def _run(self):
+        while (batch := self._next_batch()) is not None:
+            try:
+                self.expand(batch)
+                outcome = "expanded"
+            except Exception as e:
+                print(f"Background task error: {e}")
+                outcome = "failed"
+            with self._lock:
+                self._queued.difference_update(batch)
+                if outcome == "expanded":
+                    for keyword in batch:
+                        self._seen[keyword] = True
+                        self._seen.move_to_end(keyword)
+                    while len(self._seen) > self.max_seen:
+                        self._seen.popitem(last=False)
+                self._counters[outcome] += len(batch)
+                self._counters["batches"] += 1
@@ -1,4 +1,14 @@
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+import os
+import threading
+
+from model.batching import MicroBatcher
+
+MODEL_NAME = "msperka/aleph_bert_gimmel-finetuned-ner"
+# "fp32" runs the model as published; "int8" quantizes its linear layers; "onnx" runs an exported graph on ONNX Runtime
+BACKENDS = ("fp32", "int8", "onnx")
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
 
 def merge_adjacent_entities(entities):
     """
@@ -47,29 +57,129 @@ def merge_adjacent_entities(entities):
 
     return merged_entities
 
-def extract_person_names(conversation):
+def onnx_model_dir(model_name=MODEL_NAME) -> str:
+    """Where the ONNX export of a model is kept between runs."""
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), model_name.replace("/", "--") + ".onnx")
+    return os.getenv("NER_ONNX_DIR", default)
+
+
+def ner_version(backend: str) -> str:
+    """
+    Identifies the NER setup, so cached entities can be invalidated. Pass the
+    engine's `backend`, which is fp32 when the requested one failed to load.
+    """
+    return f"{MODEL_NAME}/{backend}"
+
+
+def _load_fp32(model_name, num_threads):
+    import torch
+    from transformers import AutoModelForTokenClassification
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    return AutoModelForTokenClassification.from_pretrained(model_name)
+
+
+def _load_int8(model_name, num_threads):
+    import torch
+    from transformers import AutoModelForTokenClassification
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model = AutoModelForTokenClassification.from_pretrained(model_name).eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(model_name, num_threads):
+    # Optional dependency: pip install optimum[onnxruntime]
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForTokenClassification
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    export_dir = onnx_model_dir(model_name)
+    if os.path.isdir(export_dir):
+        return ORTModelForTokenClassification.from_pretrained(export_dir, session_options=options)
+    model = ORTModelForTokenClassification.from_pretrained(model_name, export=True, session_options=options)
+    model.save_pretrained(export_dir)
+    return model
+
+
+class NEREngine:
     """
-    Extracts and prints names of entities of type PER from the conversation.
+    Long-lived NER model. Sentences submitted from any thread are grouped into
+    padded batches of up to `max_batch_size`, waiting at most `max_wait_ms`.
+
+    `backend` picks fp32 PyTorch, dynamic int8 quantization of the linear
+    layers, or an ONNX export run by ONNX Runtime (needs optimum[onnxruntime];
+    the export is cached in onnx_model_dir()). If the requested backend can't be
+    loaded the engine falls back to fp32 and `self.backend` says so.
+    `num_threads` caps the intra-op threads of PyTorch or ONNX Runtime.
     """
-    model_name = "msperka/aleph_bert_gimmel-finetuned-ner"
 
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForTokenClassification.from_pretrained(model_name)
-    nlp = pipeline("ner", model=model, tokenizer=tokenizer, grouped_entities=False)
+    def __init__(self, model_name=MODEL_NAME, max_batch_size=32, max_wait_ms=10, backend="fp32", num_threads=None):
+        # Imported here so that importing this module doesn't pay for torch/transformers
+        from transformers import AutoTokenizer, pipeline
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown NER backend: {backend}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        loaders = {"fp32": _load_fp32, "int8": _load_int8, "onnx": _load_onnx}
+        try:
+            model = loaders[backend](model_name, num_threads)
+        except Exception as e:
+            if backend == "fp32":
+                raise
+            print(f"Could not load the {backend} NER model, falling back to fp32: {e}")
+            backend = "fp32"
+            model = _load_fp32(model_name, num_threads)
+        self.backend = backend
+        self.nlp = pipeline("ner", model=model, tokenizer=tokenizer, grouped_entities=False)
+        self.max_batch_size = max_batch_size
+        self._batcher = MicroBatcher(
+            self._predict_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="ner-batcher"
+        )
+
+    def _predict_batch(self, sentences):
+        results = self.nlp(list(sentences), batch_size=self.max_batch_size)
+        return [merge_adjacent_entities(entities) for entities in results]
+
+    def predict(self, sentences):
+        """Returns the merged entities of every sentence, in order."""
+        sentences = [sentence.strip() for sentence in sentences]
+        entities = self._batcher.map([sentence for sentence in sentences if sentence])
+        results = iter(entities)
+        return [next(results) if sentence else [] for sentence in sentences]
+
+    def close(self):
+        self._batcher.close()
 
+
+def get_default_engine() -> NEREngine:
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = NEREngine()
+    return _default_engine
+
+
+def extract_person_names(conversation, engine=None):
+    """
+    Extracts names of entities of type PER from the conversation.
+    """
+    engine = engine or get_default_engine()
     sentences = conversation.split(". ")
     person_names = []
 
-    for sentence in sentences:
-        entities = nlp(sentence)
-        merged_entities = merge_adjacent_entities(entities)
-
+    for merged_entities in engine.predict(sentences):
         # Extract names of entities of type PER
         person_names.extend(entity["word"] for entity in merged_entities if entity["entity_type"] == "PER")
     person_names = list(set(person_names))  # Remove duplicates
     return person_names
 
-
 if __name__ == '__main__':
     conversation = """`
     מיה: היי אדם, מה קורה?
@@ -0,0 +1,69 @@
+import os
+import pickle
+import threading
+from tempfile import NamedTemporaryFile
+from typing import Dict, Iterable, List, Optional
+
+CACHE_FORMAT_VERSION = 1
+
+
+class LemmaCache:
+    """
+    On-disk cache of phrase lemmas, stored as a single pickle next to the lexicon.
+
+    The cache is tied to a model version string; a cache written by another
+    Stanza version is ignored and rebuilt from scratch.
+    """
+
+    def __init__(self, path: str, model_version: str):
+        self.path = path
+        self.model_version = model_version
+        self._lemmas: Dict[str, List[str]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Ignoring unreadable lemma cache {self.path}: {e}")
+            return
+        if data.get("format") != CACHE_FORMAT_VERSION or data.get("model_version") != self.model_version:
+            return
+        self._lemmas = data["lemmas"]
+
+    def __len__(self):
+        return len(self._lemmas)
+
+    def get(self, phrase: str) -> Optional[List[str]]:
+        return self._lemmas.get(phrase)
+
+    def put(self, phrase: str, lemmas: List[str]):
+        with self._lock:
+            self._lemmas[phrase] = list(lemmas)
+            self._dirty = True
+
+    def prune(self, phrases: Iterable[str]):
+        """Drop cached phrases that are no longer part of the lexicon."""
+        keep = set(phrases)
+        with self._lock:
+            stale = [phrase for phrase in self._lemmas if phrase not in keep]
+            for phrase in stale:
+                del self._lemmas[phrase]
+            self._dirty = self._dirty or bool(stale)
+
+    def save(self):
+        """Atomically write the cache if it changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"format": CACHE_FORMAT_VERSION, "model_version": self.model_version, "lemmas": self._lemmas}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with NamedTemporaryFile('wb', dir=directory, delete=False) as tmp:
+                pickle.dump(data, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp.name, self.path)
+            self._dirty = False
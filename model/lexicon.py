@@ -0,0 +1,306 @@
+import csv
+import fcntl
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+from typing import Callable, FrozenSet, List, Optional, Tuple
+
+LexiconRow = namedtuple("LexiconRow", ["phrase", "category", "score"])
+
+
+class LexiconStore:
+    """
+    The suspicious-words lexicon, held in memory and indexed by position.
+
+    Ids are 1-based row numbers in the CSV (the header is row 0), matching what
+    the /badwords endpoints have always used. Edits are appended to a JSON-lines
+    change log next to the CSV instead of rewriting it; once the log holds
+    `compact_every` operations it is folded back into the CSV with an atomic
+    write-temp-then-rename. Writers take an exclusive lock on a separate lock
+    file, so several processes can share one lexicon, and `refresh()` replays
+    edits made by other processes.
+
+    Compaction replaces the CSV and the log one after the other. Before that,
+    the version and digest of the new CSV are written to a sidecar file; a CSV
+    that matches the sidecar already holds every change up to that version,
+    so if the process stops before the log is replaced, those records of the
+    old log are skipped instead of being applied twice.
+
+    Listeners are called with ("add", id, row), ("update", id, row),
+    ("delete", id, row) or ("reload", None, rows) after every change. A
+    listener's `prepare(rows)` runs before added or edited rows are written, so
+    work that can fail (like lemmatizing them) fails before the change is made.
+    """
+
+    def __init__(self, csv_path: str, log_path: Optional[str] = None, compact_every=500):
+        self.csv_path = csv_path
+        self.log_path = log_path or os.path.splitext(csv_path)[0] + ".log"
+        self.lock_path = self.log_path + ".lock"
+        self.base_path = os.path.splitext(csv_path)[0] + ".base"
+        self.compact_every = compact_every
+        self.version = 0
+        self._header = ["word", "category", "score"]
+        self._rows: List[LexiconRow] = []
+        self._phrases = Counter()  # Membership index over the rows' phrases
+        self._listeners: List[Callable] = []
+        self._preparers: List[Callable] = []
+        self._lock = threading.RLock()
+        self._log_offset = 0
+        self._log_ops = 0
+        self._log_inode = None
+        self._csv_base = 0  # Log records up to this version are already in the CSV
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._reload()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self) -> List[LexiconRow]:
+        with self._lock:
+            return list(self._rows)
+
+    def contains(self, phrase: str) -> bool:
+        return self._phrases[phrase] > 0
+
+    def get(self, entry_id: int) -> LexiconRow:
+        with self._lock:
+            self._check_id(entry_id)
+            return self._rows[entry_id - 1]
+
+    def subscribe(self, listener: Callable, prepare: Optional[Callable] = None):
+        self._listeners.append(listener)
+        if prepare is not None:
+            self._preparers.append(prepare)
+
+    def _prepare(self, rows: List[LexiconRow]):
+        for prepare in self._preparers:
+            prepare(rows)
+
+    # Reading
+
+    def _read_csv(self) -> Tuple[List[LexiconRow], int]:
+        """The CSV's rows, and the version they are up to date with when a compaction wrote them (0 otherwise)."""
+        try:
+            with open(self.csv_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+        self._header = next(reader, self._header)
+        rows = [LexiconRow(row[0], row[1], int(row[2])) for row in reader if row]
+        try:
+            with open(self.base_path, 'r', encoding='utf-8') as f:
+                base = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return rows, 0
+        # A sidecar written for a compaction that never replaced the CSV doesn't apply to it
+        return rows, base["base"] if base.get("digest") == hashlib.sha256(data).hexdigest() else 0
+
+    def _reload(self):
+        self._rows, self._csv_base = self._read_csv()
+        self._phrases = Counter(row.phrase for row in self._rows)
+        self.version = self._csv_base
+        self._log_offset = 0
+        self._log_ops = 0
+        self._log_inode = None
+        self._replay_log(notify=False)
+        self._notify("reload", None, list(self._rows))
+
+    def _replay_log(self, notify=True):
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if self._log_inode is not None and inode != self._log_inode:
+                    raise _LogReplaced()
+                self._log_inode = inode
+                f.seek(self._log_offset)
+                while (line := f.readline()).endswith("\n"):
+                    self._log_offset = f.tell()
+                    record = json.loads(line)
+                    if "base" in record:
+                        self.version = max(self.version, record["base"])
+                        continue
+                    if record["v"] <= self._csv_base:
+                        continue  # Already folded into the CSV by a compaction that stopped before replacing the log
+                    self._apply(record["op"], record["id"], LexiconRow(*record["row"]), notify)
+                    self.version = record["v"]
+                    self._log_ops += 1
+        except FileNotFoundError:
+            if self._log_inode is not None:
+                raise _LogReplaced()
+
+    def refresh(self):
+        """Apply changes made by other processes since the last read."""
+        with self._lock:
+            try:
+                stat = os.stat(self.log_path)
+                if stat.st_ino == self._log_inode and stat.st_size == self._log_offset:
+                    return
+            except FileNotFoundError:
+                if self._log_inode is None:
+                    return
+            with self._file_lock(fcntl.LOCK_SH):
+                self._refresh_locked()
+
+    def _refresh_locked(self):
+        try:
+            self._replay_log()
+        except _LogReplaced:
+            # The log was compacted into the CSV by another process
+            self._reload()
+
+    @contextmanager
+    def _file_lock(self, mode):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def changed_phrases(self, since: int) -> Optional[FrozenSet[str]]:
+        """
+        Phrases added, edited (old and new text) or deleted after version
+        `since`, found by replaying the change log on the CSV. None when the log
+        no longer reaches back to `since` because it was compacted, or when
+        `since` is newer than the lexicon on disk.
+        """
+        with self._file_lock(fcntl.LOCK_SH):
+            rows, csv_base = self._read_csv()
+            base = version = csv_base
+            changed = set()
+            try:
+                with open(self.log_path, 'r', encoding='utf-8') as f:
+                    while (line := f.readline()).endswith("\n"):
+                        record = json.loads(line)
+                        if "base" in record:
+                            base = version = max(version, record["base"])
+                            continue
+                        if record["v"] <= csv_base:
+                            continue
+                        op, entry_id, row = record["op"], record["id"], LexiconRow(*record["row"])
+                        if record["v"] > since:
+                            changed.add(row.phrase)
+                            if op == "update":
+                                changed.add(rows[entry_id - 1].phrase)
+                        if op == "add":
+                            rows.append(row)
+                        elif op == "update":
+                            rows[entry_id - 1] = row
+                        elif op == "delete":
+                            rows.pop(entry_id - 1)
+                        version = record["v"]
+            except FileNotFoundError:
+                pass
+        if since < base or since > version:
+            return None
+        return frozenset(changed)
+
+    # Writing
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh_locked()
+            with open(self.log_path, 'a', encoding='utf-8') as log:
+                yield log
+
+    def _check_id(self, entry_id: int):
+        if entry_id < 1 or entry_id > len(self._rows):
+            raise KeyError(entry_id)
+
+    def _apply(self, op: str, entry_id: int, row: LexiconRow, notify=True):
+        if op == "add":
+            self._rows.append(row)
+        elif op == "update":
+            self._phrases[self._rows[entry_id - 1].phrase] -= 1
+            self._rows[entry_id - 1] = row
+        elif op == "delete":
+            row = self._rows.pop(entry_id - 1)
+            self._phrases[row.phrase] -= 1
+        if op in ("add", "update"):
+            self._phrases[row.phrase] += 1
+        if notify:
+            self._notify(op, entry_id, row)
+
+    def _notify(self, op, entry_id, row):
+        for listener in self._listeners:
+            listener(op, entry_id, row)
+
+    def _write(self, log, op: str, entry_id: int, row: LexiconRow):
+        record = {"v": self.version + 1, "op": op, "id": entry_id, "row": list(row)}
+        log.write(json.dumps(record, ensure_ascii=False) + "\n")
+        log.flush()
+        os.fsync(log.fileno())
+        self._log_offset = log.tell()
+        self._log_inode = os.fstat(log.fileno()).st_ino
+        self._log_ops += 1
+        self.version += 1
+        self._apply(op, entry_id, row)
+
+    def add(self, phrase: str, category: str, score: int) -> int:
+        return self.add_many([(phrase, category, score)])[0]
+
+    def add_many(self, rows) -> List[int]:
+        """Append rows and return their ids."""
+        rows = [LexiconRow(phrase, category, int(score)) for phrase, category, score in rows]
+        self._prepare(rows)
+        with self._exclusive() as log:
+            ids = []
+            for row in rows:
+                self._write(log, "add", len(self._rows) + 1, row)
+                ids.append(len(self._rows))
+            self._maybe_compact()
+            return ids
+
+    def update(self, entry_id: int, phrase: str, category: str, score: int):
+        row = LexiconRow(phrase, category, int(score))
+        self._prepare([row])
+        with self._exclusive() as log:
+            self._check_id(entry_id)
+            self._write(log, "update", entry_id, row)
+            self._maybe_compact()
+
+    def delete(self, entry_id: int):
+        with self._exclusive() as log:
+            self._check_id(entry_id)
+            self._write(log, "delete", entry_id, self._rows[entry_id - 1])
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._log_ops >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Fold the change log into the CSV. Callers must hold the log lock."""
+        directory = os.path.dirname(os.path.abspath(self.csv_path))
+        buffer = io.StringIO(newline='')
+        writer = csv.writer(buffer)
+        writer.writerow(self._header)
+        writer.writerows(self._rows)
+        data = buffer.getvalue().encode('utf-8')
+
+        # Written first, so a crash before the log is replaced can't replay it on top of the new CSV
+        with NamedTemporaryFile('w', encoding='utf-8', dir=directory, delete=False) as tmp:
+            json.dump({"base": self.version, "digest": hashlib.sha256(data).hexdigest()}, tmp)
+        os.replace(tmp.name, self.base_path)
+        with NamedTemporaryFile('wb', dir=directory, delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, self.csv_path)
+        self._csv_base = self.version
+
+        with NamedTemporaryFile('w', encoding='utf-8', dir=directory, delete=False) as tmp:
+            tmp.write(json.dumps({"base": self.version}) + "\n")
+        os.replace(tmp.name, self.log_path)
+        self._log_inode = os.stat(self.log_path).st_ino
+        self._log_offset = os.path.getsize(self.log_path)
+        self._log_ops = 0
+
+
+class _LogReplaced(Exception):
+    pass
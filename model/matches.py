@@ -0,0 +1,22 @@
+from typing import Collection, List, Sequence, Tuple
+
+from model.streaming import normalize_score
+
+# A lexicon match as stored on a case: {"phrase", "text", "score", "category", "sentence"}
+Match = dict
+
+
+def score_matches(matches: Sequence[Match]) -> Tuple[int, List[str], List[str]]:
+    """The risk score, flagged keywords and categories of a case's lexicon matches."""
+    total_score = sum(match["score"] for match in matches)
+    categories = list(dict.fromkeys(match["category"] for match in matches))
+    return normalize_score(total_score), [match["text"] for match in matches], categories
+
+
+def merge_matches(matches: Sequence[Match], changed: Collection[str], new_matches: Sequence[Match]) -> List[Match]:
+    """
+    Replace the matches of the `changed` lexicon phrases with `new_matches`,
+    which were found with only those phrases. Matches stay in sentence order.
+    """
+    kept = [match for match in matches if match["phrase"] not in changed]
+    return sorted(kept + list(new_matches), key=lambda match: match["sentence"])
@@ -0,0 +1,111 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from model.extract_entities import BACKENDS, MODEL_NAME, NEREngine
+
+REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ner_reference.jsonl")
+
+
+def load_reference(path=REFERENCE_PATH):
+    """Reference sentences as {"text", "names"} dicts; "names" (the gold PER entities) is optional."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _names(entities):
+    return {entity["word"] for entity in entities if entity["entity_type"] == "PER"}
+
+
+def _recall(predicted, expected):
+    found = sum(len(p & e) for p, e in zip(predicted, expected))
+    total = sum(len(e) for e in expected)
+    return found / total if total else None
+
+
+def _precision(predicted, expected):
+    found = sum(len(p & e) for p, e in zip(predicted, expected))
+    total = sum(len(p) for p in predicted)
+    return found / total if total else None
+
+
+def evaluate(backend, texts, num_threads=None, repeat=3):
+    """
+    PER names per text, per-sentence latency and the memory the engine took.
+    Run it in a fresh process (see evaluate_isolated): ru_maxrss never goes
+    down, so a second engine in the same process can't be measured.
+    """
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    engine = NEREngine(MODEL_NAME, backend=backend, num_threads=num_threads)
+    load_seconds = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    predictions = [_names(entities) for entities in engine.predict(texts)]  # Also warms the engine up
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            engine.predict([text])
+            latencies.append((time.perf_counter() - started) * 1000)
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    engine.close()
+    latencies.sort()
+    return predictions, {
+        "backend": engine.backend,
+        "load_seconds": load_seconds,
+        "latency_ms": {
+            "p50": latencies[len(latencies) // 2],
+            "p90": latencies[int(len(latencies) * 0.9)],
+            "mean": sum(latencies) / len(latencies),
+        },
+        # ru_maxrss is in KiB on Linux
+        "load_rss_growth_mb": (rss_after - rss_before) / 1024,
+        "peak_rss_growth_mb": (rss_peak - rss_before) / 1024,
+    }
+
+
+def evaluate_isolated(backend, texts, num_threads=None, repeat=3):
+    """evaluate() in a process of its own, so its memory figures only cover this backend."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(evaluate, backend, texts, num_threads, repeat).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a faster NER backend with the fp32 model on a reference set.")
+    parser.add_argument("--backend", choices=[backend for backend in BACKENDS if backend != "fp32"], default="int8")
+    parser.add_argument("--reference", default=REFERENCE_PATH, help="JSON lines with \"text\" and optionally gold \"names\"")
+    parser.add_argument("--threads", type=int, help="Intra-op threads for both backends")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the reference set")
+    args = parser.parse_args()
+
+    reference = load_reference(args.reference)
+    texts = [item["text"] for item in reference]
+    baseline, baseline_stats = evaluate_isolated("fp32", texts, args.threads, args.repeat)
+    candidate, candidate_stats = evaluate_isolated(args.backend, texts, args.threads, args.repeat)
+
+    report = {
+        "model": MODEL_NAME,
+        "sentences": len(texts),
+        "fp32": baseline_stats,
+        "candidate": candidate_stats,
+        # How many of the fp32 model's PER names the candidate still finds, and how many of its names fp32 agrees with
+        "recall_vs_fp32": _recall(candidate, baseline),
+        "precision_vs_fp32": _precision(candidate, baseline),
+        "speedup_p50": baseline_stats["latency_ms"]["p50"] / candidate_stats["latency_ms"]["p50"],
+    }
+    gold = [set(item["names"]) for item in reference if "names" in item]
+    if len(gold) == len(reference):
+        report["fp32_gold_recall"] = _recall(baseline, gold)
+        report["candidate_gold_recall"] = _recall(candidate, gold)
+        if report["fp32_gold_recall"] is not None:
+            report["gold_recall_lost"] = report["fp32_gold_recall"] - report["candidate_gold_recall"]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
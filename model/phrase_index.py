@@ -0,0 +1,87 @@
+from collections import defaultdict
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+Entry = Tuple[List[str], int, str]
+
+
+class PhraseIndex:
+    """
+    Inverted index from lemma to suspicious phrases.
+
+    Each phrase is filed under its rarest lemma, so a sentence only has to look
+    at the phrases keyed by lemmas it actually contains. Phrases match when all
+    of their lemmas appear anywhere in the sentence, and matches are reported in
+    insertion order, exactly like a linear scan over the lexicon.
+    """
+
+    def __init__(self, entries: Iterable[Entry] = ()):
+        self._entries = {}
+        self._keys = {}
+        self._buckets = defaultdict(set)
+        self._always = set()  # Phrases without lemmas match every sentence
+        self._next_id = 0
+        for lemmas, score, category in entries:
+            self.add(lemmas, score, category)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entries
+
+    def get(self, entry_id) -> Optional[Entry]:
+        return self._entries.get(entry_id)
+
+    def entries(self) -> List[Tuple[int, Entry]]:
+        return sorted(self._entries.items())
+
+    def add(self, lemmas: Sequence[str], score: int, category: str) -> int:
+        """Index a phrase and return its id."""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._insert(entry_id, (list(lemmas), score, category))
+        return entry_id
+
+    def replace(self, entry_id: int, lemmas: Sequence[str], score: int, category: str):
+        """Swap the phrase stored under `entry_id`, keeping its position."""
+        self.remove(entry_id)
+        self._insert(entry_id, (list(lemmas), score, category))
+
+    def remove(self, entry_id: int):
+        if self._entries.pop(entry_id, None) is None:
+            return
+        key = self._keys.pop(entry_id)
+        if key is None:
+            self._always.discard(entry_id)
+            return
+        bucket = self._buckets[key]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._buckets[key]
+
+    def _insert(self, entry_id: int, entry: Entry):
+        lemmas = entry[0]
+        self._entries[entry_id] = entry
+        if not lemmas:
+            self._keys[entry_id] = None
+            self._always.add(entry_id)
+            return
+        key = min(lemmas, key=lambda lemma: len(self._buckets.get(lemma, ())))
+        self._keys[entry_id] = key
+        self._buckets[key].add(entry_id)
+
+    def match(self, sentence_lemmas: Sequence[str]) -> List[Tuple[int, Entry]]:
+        """Return the phrases whose lemmas all occur in the sentence, in insertion order."""
+        present = set(sentence_lemmas)
+        candidates = set(self._always)
+        for lemma in present:
+            bucket = self._buckets.get(lemma)
+            if bucket:
+                candidates.update(bucket)
+
+        matches = []
+        for entry_id in sorted(candidates):
+            entry = self._entries.get(entry_id)
+            if entry is not None and all(lemma in present for lemma in entry[0]):
+                matches.append((entry_id, entry))
+        return matches
@@ -1,103 +1,274 @@
-from gensim.models import KeyedVectors
 import os
-import csv
 import stanza
-from typing import List, Tuple
+from typing import Collection, Dict, List, Sequence, Tuple
+
+from model.batching import MicroBatcher
+from model.lemma_cache import LemmaCache
+from model.lexicon import LexiconStore
+from model.phrase_index import PhraseIndex
+from model.similarity import SimilarityIndex, ann_index_path, neighbour_cache_path, vectors_version
+from model.streaming import Sentence, normalize_score
+from model.vectors import load_vectors
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def stanza_model_version(lang: str, processors: str) -> str:
+    """Identifies the Stanza models whose lemmas are cached."""
+    resources_version = getattr(stanza.resources.common, "DEFAULT_RESOURCES_VERSION", "unknown")
+    return f"stanza-{stanza.__version__}/{resources_version}/{lang}/{processors}"
+
+SENTENCE_END = (".", "!", "?", "…")
 
 
 class SuspiciousWordDetector:
-    def __init__(self, lang='he', binary_file_path=None):
-        """Initialize Stanza pipeline and load required resources."""
-        stanza.download(lang)
-        self.nlp = stanza.Pipeline(lang=lang, processors='tokenize,mwt,pos,lemma')
+    def __init__(self, lang='he', binary_file_path=None, offline=None, max_batch_size=16, max_wait_ms=10,
+                 lexicon_path=None, tokenize_batch=None):
+        """
+        Initialize Stanza pipeline and load required resources.
+
+        In offline mode (or with STANZA_OFFLINE=1) the Stanza download check is
+        skipped and models are loaded from the local cache only. Texts from
+        concurrent callers are coalesced into Stanza batches of up to
+        `max_batch_size` documents, waiting at most `max_wait_ms`.
+
+        `tokenize_batch` replaces Stanza with another function turning a list
+        of texts into sentences of (text, lemma) pairs, e.g. for benchmarks.
+        """
+        processors = 'tokenize,mwt,pos,lemma'
+        if tokenize_batch is None:
+            offline = _env_flag("STANZA_OFFLINE") if offline is None else offline
+            if offline:
+                self.nlp = stanza.Pipeline(lang=lang, processors=processors, download_method=None)
+            else:
+                stanza.download(lang)
+                self.nlp = stanza.Pipeline(lang=lang, processors=processors)
+            tokenize_batch = self._process_batch
+            model_version = stanza_model_version(lang, processors)
+        else:
+            model_version = f"custom/{getattr(tokenize_batch, '__qualname__', 'tokenizer')}"
+        # Lemmatized transcripts are only comparable between runs of the same tokenizer
+        self.tokenizer_version = model_version
+        # All pipeline calls go through this single thread
+        self._batcher = MicroBatcher(
+            tokenize_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="stanza-batcher"
+        )
         self.project_path = os.path.dirname(os.path.abspath(__file__))
-        self.suspicious_words_file = os.path.join(self.project_path, "suspicious_words.csv")
-        self.suspicious_entries, self.entries = self._load_suspicious_entries()
-
-        self.model = KeyedVectors.load(binary_file_path)
-
-    def _load_suspicious_entries(self) -> List[Tuple[List[str], int, str]]:
-        """Load suspicious words from CSV."""
-        if not os.path.exists(self.suspicious_words_file):
-            return []
-        lemma_entries = []
-        entries = []
-        with open(self.suspicious_words_file, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader, None)  # Skip header
-            for row in reader:
-                phrase, category, score = row[0], row[1], int(row[2])
-                lemmatized_phrase = [
-                    word.lemma for sentence in self.nlp(phrase).sentences for word in sentence.words
-                ]
-                lemma_entries.append((lemmatized_phrase, score, category))
-                entries.append(phrase)
-        return lemma_entries, entries
+        self.suspicious_words_file = lexicon_path or os.path.join(self.project_path, "suspicious_words.csv")
+        self.lemma_cache = LemmaCache(
+            os.path.splitext(self.suspicious_words_file)[0] + ".lemmas.pkl",
+            model_version,
+        )
+        # Lexicon edits are applied to the phrase index as they happen
+        self.lexicon = LexiconStore(self.suspicious_words_file)
+        self._on_lexicon_change("reload", None, self.lexicon.rows())
+        # New phrases are lemmatized before they are written, so a Stanza failure leaves the lexicon unchanged
+        self.lexicon.subscribe(
+            self._on_lexicon_change, prepare=lambda rows: self._lemmatize_phrases([row.phrase for row in rows])
+        )
+
+        self.model = load_vectors(binary_file_path, mmap=os.getenv("VECTORS_MMAP", "1").lower() in ("1", "true", "yes"))
+        self.similarity = SimilarityIndex(
+            self.model,
+            cache_path=neighbour_cache_path(binary_file_path),
+            ann_path=ann_index_path(binary_file_path),
+            model_version=vectors_version(binary_file_path, len(self.model.index_to_key)),
+        )
+
+    def _process_batch(self, texts: List[str]) -> List[List[Sentence]]:
+        docs = self.nlp([stanza.Document([], text=text) for text in texts])
+        return [
+            [[(word.text, word.lemma) for word in sentence.words] for sentence in doc.sentences]
+            for doc in docs
+        ]
+
+    def tokenize_many(self, texts: Sequence[str]) -> List[List[Sentence]]:
+        """Split many texts into sentences of (text, lemma) pairs using batched Stanza calls."""
+        return self._batcher.map(texts)
+
+    def lemmatize_many(self, texts: Sequence[str]) -> List[List[str]]:
+        """Lemmatize many texts using batched Stanza calls, one flat lemma list per text."""
+        return [
+            [lemma for sentence in sentences for _, lemma in sentence]
+            for sentences in self.tokenize_many(texts)
+        ]
+
+    def _lemmatize_phrases(self, phrases: Sequence[str]) -> List[List[str]]:
+        """Lemmatize lexicon phrases, going through the on-disk lemma cache."""
+        missing = list(dict.fromkeys(phrase for phrase in phrases if self.lemma_cache.get(phrase) is None))
+        for phrase, lemmas in zip(missing, self.lemmatize_many(missing)):
+            self.lemma_cache.put(phrase, lemmas)
+        return [self.lemma_cache.get(phrase) for phrase in phrases]
+
+    def _on_lexicon_change(self, op, entry_id, row):
+        """Keep the phrase index in step with the lexicon store."""
+        try:
+            self._apply_lexicon_change(op, entry_id, row)
+        except Exception as e:
+            if op == "reload":
+                raise
+            # Rebuild rather than leave index ids out of step with the store's
+            print(f"Rebuilding the phrase index after a failed {op}: {e}")
+            self._apply_lexicon_change("reload", None, self.lexicon.rows())
+
+    def _apply_lexicon_change(self, op, entry_id, row):
+        if op == "reload":
+            phrases = [entry.phrase for entry in row]
+            phrase_index, entry_phrases = self._build_index(row)
+            self.lemma_cache.prune(phrases)
+            self.phrase_index, self._entry_phrases = phrase_index, entry_phrases
+            self._entry_ids = list(entry_phrases)
+        elif op == "add":
+            lemmas = self._lemmatize_phrases([row.phrase])[0]
+            index_id = self.phrase_index.add(lemmas, row.score, row.category)
+            self._entry_ids.append(index_id)
+            self._entry_phrases[index_id] = row.phrase
+        elif op == "update":
+            lemmas = self._lemmatize_phrases([row.phrase])[0]
+            index_id = self._entry_ids[entry_id - 1]
+            self.phrase_index.replace(index_id, lemmas, row.score, row.category)
+            self._entry_phrases[index_id] = row.phrase
+        elif op == "delete":
+            index_id = self._entry_ids.pop(entry_id - 1)
+            self.phrase_index.remove(index_id)
+            self._entry_phrases.pop(index_id, None)
+        self.lemma_cache.save()
+
+    def _build_index(self, rows) -> Tuple[PhraseIndex, Dict[int, str]]:
+        """A phrase index over lexicon rows, and the lexicon phrase behind each of its ids."""
+        phrase_index = PhraseIndex()
+        entry_phrases = {}
+        for lemmas, entry in zip(self._lemmatize_phrases([entry.phrase for entry in rows]), rows):
+            entry_phrases[phrase_index.add(lemmas, entry.score, entry.category)] = entry.phrase
+        return phrase_index, entry_phrases
+
+    def phrase_subindex(self, phrases: Collection[str]) -> Tuple[PhraseIndex, Dict[int, str]]:
+        """An index over just the lexicon entries whose phrase is in `phrases`, for match_sentences."""
+        return self._build_index([row for row in self.lexicon.rows() if row.phrase in phrases])
+
+    def refresh(self):
+        """Pick up lexicon edits made by other processes."""
+        self.lexicon.refresh()
+
+    @staticmethod
+    def _clean_word(word: str) -> str:
+        # Remove prefixes like 'NN_' and replace '~' with space
+        if '_' in word:
+            word = word.split('_', 1)[1]  # Keep only the part after the first underscore
+        return word.replace('~', ' ')
 
     def _find_similar_words(self, word:str, topn=2) -> List[str]:
-        def clean_word(word):
-            # Remove prefixes like 'NN_' and replace '~' with space
-            if '_' in word:
-                word = word.split('_', 1)[1]  # Keep only the part after the first underscore
-            return word.replace('~', ' ')
-        
         try:
             # Find the most similar words to the current word
-            return [clean_word(similar_word) for similar_word, _ in self.model.most_similar(word, topn=topn)]
+            return [self._clean_word(similar_word) for similar_word, _ in self.similarity.most_similar(word, topn=topn)]
         except KeyError:
             print(f"'{word}' not found in the vocabulary!")
         return []
+
+    def _find_similar_words_many(self, words: Sequence[str], topn=2) -> List[str]:
+        """Similar words of all `words`, looked up together."""
+        neighbours = self.similarity.most_similar_many(words, topn=topn)
+        similar_words = []
+        for word in words:
+            if word not in neighbours:
+                print(f"'{word}' not found in the vocabulary!")
+                continue
+            similar_words.extend(self._clean_word(similar_word) for similar_word, _ in neighbours[word])
+        return similar_words
     
     def add_related_words(self, new_words: List[str], topn=2):
-            """Add new suspicious words and their similar words to the CSV."""
-            new_entries = []
-            for word in new_words:
-                # _find_similar_words expects a list, so pass a single-word list
-                similar_words = self._find_similar_words(word, topn)
-                for similar_word in similar_words:
-                    if similar_word not in self.entries:
-                        # Lemmatize the similar word
-                        lemmatized_similar_word = [
-                            word.lemma for sentence in self.nlp(similar_word).sentences for word in sentence.words
-                        ]
-                        new_entries.append([similar_word, "לא ידוע", 5])
-                        
-                        # Update both self.suspicious_entries and self.entries
-                        self.suspicious_entries.append((lemmatized_similar_word, 5, "לא ידוע"))
-                        self.entries.append(similar_word)
-
-            # Write new entries to CSV
-            if new_entries:
-                with open(self.suspicious_words_file, 'a', encoding='utf-8', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerows(new_entries)
+            """Add new suspicious words and their similar words to the lexicon."""
+            candidates = []
+            for similar_word in self._find_similar_words_many(list(dict.fromkeys(new_words)), topn):
+                if not self.lexicon.contains(similar_word) and similar_word not in candidates:
+                    candidates.append(similar_word)
+            self.similarity.save_cache()
+
+            if candidates:
+                # The lexicon lemmatizes all similar words in one batch before it adds them
+                self.lexicon.add_many([(similar_word, "לא ידוע", 5) for similar_word in candidates])
 
     def analyze_text(self, text: str) -> Tuple[int, List[str], List[str]]:
         """Analyze text for suspicious content"""
-        doc = self.nlp(text)
+        return self.analyze_sentences(self.tokenize_many([text])[0])
+
+    def _match_sentence(self, sentence: Sequence[Tuple[str, str]], exclude=(), phrase_index=None):
+        """Yield (entry id, matched text, score, category) for phrases found in one sentence"""
+        sentence_words = [lemma for _, lemma in sentence]
+        first_index = {}
+        for i, lemma in enumerate(sentence_words):
+            first_index.setdefault(lemma, i)
+
+        for entry_id, (lemmatized_words, score, category) in (phrase_index or self.phrase_index).match(sentence_words):
+            if entry_id in exclude:
+                continue
+            matched_indices = [first_index[word] for word in lemmatized_words]
+            matched_phrase = "".join([sentence[i][0] + (" " if len(sentence[i][0]) > 1 else "") for i in matched_indices]).strip()
+            yield entry_id, matched_phrase, score, category
+
+    def analyze_sentences(self, sentences: Sequence[Sequence[Tuple[str, str]]]) -> Tuple[int, List[str], List[str]]:
+        """Analyze already lemmatized sentences, given as (text, lemma) pairs"""
         total_score = 0
         matched_categories = set()
         matched_phrases = []
 
-        for sentence in doc.sentences:
-            sentence_words = [word.lemma for word in sentence.words]
-
-            for lemmatized_words, score, category in self.suspicious_entries:
-                if all(word in sentence_words for word in lemmatized_words):
-                    matched_indices = [sentence_words.index(word) for word in lemmatized_words]
-                    matched_phrase = "".join([sentence.words[i].text + (" " if len(sentence.words[i].text) > 1 else "") for i in matched_indices]).strip()
-                    total_score += score
-                    matched_categories.add(category)
-                    matched_phrases.append(matched_phrase)
+        for sentence in sentences:
+            for _, matched_phrase, score, category in self._match_sentence(sentence):
+                total_score += score
+                matched_categories.add(category)
+                matched_phrases.append(matched_phrase)
 
         return total_score, list(matched_categories), matched_phrases
-    
+
+    def match_sentences(self, sentences: Sequence[Sequence[Tuple[str, str]]], index=None) -> List[dict]:
+        """
+        Every lexicon match in already lemmatized sentences, as dicts with the
+        lexicon "phrase", the matched "text", its "score" and "category", and
+        the "sentence" it was found in. `index` is a (phrase index, phrases)
+        pair from phrase_subindex to match only some entries.
+        """
+        phrase_index, entry_phrases = index or (self.phrase_index, self._entry_phrases)
+        return [
+            {"phrase": entry_phrases[entry_id], "text": text, "score": score, "category": category, "sentence": i}
+            for i, sentence in enumerate(sentences)
+            for entry_id, text, score, category in self._match_sentence(sentence, phrase_index=phrase_index)
+        ]
+
+    def analyze_segment(self, text: str, carry: Sequence[Tuple[str, str]] = (), max_carry=50) -> Tuple[int, List[str], List[str], Sentence]:
+        """
+        Analyze a transcript segment that continues earlier ones.
+
+        `carry` is the unfinished last sentence of the previous segment; it is
+        joined to the first sentence of `text`, and phrases it matched on its own
+        (already reported) are skipped. Returns the score, categories and phrases
+        found in this segment, plus the sentence to carry into the next one (at
+        most `max_carry` tokens).
+        """
+        sentences = self.tokenize_many([text])[0] if text.strip() else []
+        already_matched = set()
+        if carry:
+            already_matched = {entry_id for entry_id, _ in self.phrase_index.match([lemma for _, lemma in carry])}
+            sentences = [list(carry) + (sentences[0] if sentences else [])] + sentences[1:]
+
+        total_score = 0
+        matched_categories = set()
+        matched_phrases = []
+        for i, sentence in enumerate(sentences):
+            for _, matched_phrase, score, category in self._match_sentence(sentence, already_matched if i == 0 else ()):
+                total_score += score
+                matched_categories.add(category)
+                matched_phrases.append(matched_phrase)
+
+        last = sentences[-1] if sentences else []
+        next_carry = [] if not last or last[-1][0].endswith(SENTENCE_END) else list(last[-max_carry:])
+        return total_score, list(matched_categories), matched_phrases, next_carry
+
     def calculate_score(self, text: str) -> Tuple[int, List[str], List[str]]:
         """Calculate sentence score"""
         total_score, matched_categories, matched_phrases = self.analyze_text(text)
-        normalized_score = 0 if total_score <= 5 else min(98, int((total_score / 600) * 100))
-
-        return normalized_score, matched_phrases, matched_categories
+        return normalize_score(total_score), matched_phrases, matched_categories
 
 # Usage Example
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+import argparse
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Neighbours = List[Tuple[str, float]]
+
+
+def _top_k(scores: np.ndarray, k: int, exclude: Optional[int] = None) -> List[int]:
+    """Indices of the `k` highest scores, best first, skipping `exclude`."""
+    k_with_self = min(k + 1, len(scores))
+    if k_with_self <= 0:
+        return []
+    best = np.argpartition(-scores, k_with_self - 1)[:k_with_self]
+    best = best[np.argsort(-scores[best])]
+    return [int(i) for i in best if i != exclude][:k]
+
+
+def normalized_vectors(kv, chunk_size=65536) -> np.ndarray:
+    """
+    Unit-length vectors of a KeyedVectors model. Vectors converted for mmap
+    already are; vectors loaded into the heap are scaled in place, a chunk of
+    rows at a time, instead of being copied into a second full matrix.
+    """
+    vectors = kv.vectors
+    if getattr(kv, "vectors_normalized", False):
+        return vectors
+    if not vectors.flags.writeable:
+        return kv.get_normed_vectors()
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block /= norms
+    kv.norms = None  # gensim's cached norms no longer apply
+    kv.vectors_normalized = True
+    return vectors
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit vectors: the vocabulary is clustered with
+    spherical k-means and a query is compared only with the vectors of its
+    `nprobe` closest clusters.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, model_version=""):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.model_version = model_version
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size=65536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ]).astype(np.int32)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist=256, iterations=10, sample_size=100000, seed=0,
+              model_version="") -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+        nlist = min(nlist, len(sample))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = cls._assign(sample, centroids)
+            for cluster in range(nlist):
+                members = sample[assignments == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+        return cls(centroids, cls._assign(vectors, centroids), model_version)
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments,
+                     model_version=np.array(self.model_version))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = np.load(path)
+        model_version = data["model_version"].item() if "model_version" in data.files else ""
+        return cls(data["centroids"], data["assignments"], model_version)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = _top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self.lists[cluster] for cluster in probes])
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour lookups over a KeyedVectors model.
+
+    Results are memoized per word in an LRU that can be persisted to
+    `cache_path`, so keywords flagged case after case are only looked up once.
+    Misses are answered for all words at once, either exactly with one matrix
+    multiply over the vocabulary or, when an IVF index is given, approximately.
+
+    Both files are stamped with `model_version` (see vectors_version); ones
+    written for another version of the model are ignored.
+    """
+
+    def __init__(self, keyed_vectors, cache_size=10000, cache_path: Optional[str] = None,
+                 ann_path: Optional[str] = None, nprobe=8, model_version=""):
+        self.kv = keyed_vectors
+        self.cache_size = cache_size
+        self.cache_path = cache_path
+        self.nprobe = nprobe
+        self.model_version = model_version
+        self._vectors = normalized_vectors(self.kv)
+        self._memo: "OrderedDict[str, Neighbours]" = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.ann = self._load_ann(ann_path) if ann_path and os.path.exists(ann_path) else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    data = pickle.load(f)
+                if data.get("model_version") == model_version:
+                    self._memo.update(data["neighbours"])
+            except Exception as e:
+                print(f"Ignoring unreadable neighbour cache {cache_path}: {e}")
+
+    def _load_ann(self, path: str) -> Optional[IVFIndex]:
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable ANN index {path}: {e}")
+            return None
+        if index.model_version != self.model_version or len(index.assignments) != len(self._vectors):
+            print(f"Ignoring ANN index {path}, which was built for another version of the model")
+            return None
+        return index
+
+    def most_similar(self, word: str, topn=2) -> Neighbours:
+        """Like KeyedVectors.most_similar; raises KeyError for unknown words."""
+        if word not in self.kv.key_to_index:
+            raise KeyError(word)
+        return self.most_similar_many([word], topn)[word]
+
+    def most_similar_many(self, words: Sequence[str], topn=2) -> Dict[str, Neighbours]:
+        """Neighbours of every known word in `words`; unknown words are left out."""
+        results = {}
+        missing = []
+        with self._lock:
+            for word in dict.fromkeys(words):
+                neighbours = self._memo.get(word)
+                if neighbours is not None and len(neighbours) >= topn:
+                    self._memo.move_to_end(word)
+                    results[word] = neighbours[:topn]
+                elif word in self.kv.key_to_index:
+                    missing.append(word)
+
+        if missing:
+            computed = self._search(missing, topn)
+            with self._lock:
+                for word, neighbours in computed.items():
+                    self._memo[word] = neighbours
+                    self._memo.move_to_end(word)
+                while len(self._memo) > self.cache_size:
+                    self._memo.popitem(last=False)
+                self._dirty = True
+            results.update(computed)
+        return results
+
+    def _search(self, words: List[str], topn: int) -> Dict[str, Neighbours]:
+        indices = [self.kv.key_to_index[word] for word in words]
+        queries = self._vectors[indices]
+        results = {}
+        if self.ann is None:
+            scores = queries @ self._vectors.T
+            for word, index, row in zip(words, indices, scores):
+                results[word] = [(self.kv.index_to_key[i], float(row[i])) for i in _top_k(row, topn, exclude=index)]
+            return results
+
+        for word, index, query in zip(words, indices, queries):
+            candidates = self.ann.candidates(query, self.nprobe)
+            scores = self._vectors[candidates] @ query
+            own = np.flatnonzero(candidates == index)
+            best = _top_k(scores, topn, exclude=int(own[0]) if len(own) else None)
+            results[word] = [(self.kv.index_to_key[candidates[i]], float(scores[i])) for i in best]
+        return results
+
+    def save_cache(self):
+        """Persist the memo if it changed since the last save."""
+        if not self.cache_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"model_version": self.model_version, "neighbours": dict(self._memo)}
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        with NamedTemporaryFile('wb', dir=directory, delete=False) as tmp:
+            pickle.dump(data, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp.name, self.cache_path)
+
+
+def vectors_version(binary_file_path: str, vocab_size: int) -> str:
+    """Identifies a word-vector model by its file's mtime and its vocabulary size."""
+    return f"{os.stat(binary_file_path).st_mtime_ns}/{vocab_size}"
+
+
+def ann_index_path(binary_file_path: str) -> str:
+    return os.path.splitext(binary_file_path)[0] + ".ivf.npz"
+
+
+def neighbour_cache_path(binary_file_path: str) -> str:
+    return os.path.splitext(binary_file_path)[0] + ".neighbours.pkl"
+
+
+def main():
+    from model.vectors import load_vectors
+
+    parser = argparse.ArgumentParser(description="Build the approximate nearest-neighbour index for a word-vector model.")
+    parser.add_argument("model", help="KeyedVectors file, e.g. model/words2vec.bin")
+    parser.add_argument("--nlist", type=int, default=256, help="Number of clusters")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    kv = load_vectors(args.model)
+    index = IVFIndex.build(
+        normalized_vectors(kv), nlist=args.nlist, iterations=args.iterations,
+        model_version=vectors_version(args.model, len(kv.index_to_key)),
+    )
+    index.save(ann_index_path(args.model))
+    print(f"Saved {args.nlist}-list index to {ann_index_path(args.model)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,291 @@
+import io
+import mmap
 import os
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
 import speech_recognition as sr
+from pydub import AudioSegment
+from pydub.silence import detect_nonsilent, detect_silence
+
+
+class GoogleBackend:
+    """Transcribes audio chunks with the Google Web Speech API."""
+
+    def __init__(self, language="he-IL"):
+        self.language = language
+
+    def transcribe(self, audio: AudioSegment) -> str:
+        buffer = io.BytesIO()
+        audio.export(buffer, format="wav")
+        buffer.seek(0)
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(buffer) as source:
+            audio_data = recognizer.record(source)
+        try:
+            return recognizer.recognize_google(audio_data, language=self.language)
+        except sr.UnknownValueError:
+            return ""  # Silence or unintelligible speech
+
+
+class StubBackend:
+    """Offline stand-in that returns a fixed text (or a description of the chunk)."""
+
+    def __init__(self, text: Optional[str] = None):
+        self.text = text
+
+    def transcribe(self, audio: AudioSegment) -> str:
+        return self.text if self.text is not None else f"[{len(audio)}ms]"
+
+
+BACKENDS = {"google": GoogleBackend, "stub": StubBackend}
+
+
+def get_backend(name: Optional[str] = None):
+    """Build the transcription backend named by `name` or the STT_BACKEND variable."""
+    name = name or os.getenv("STT_BACKEND", "google")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+    return BACKENDS[name]()
+
+
+@contextmanager
+def open_audio(input_file):
+    """Memory-map an audio file so readers page it in from the OS cache instead of copying it."""
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
 
 
-def speech_to_text_func(input_file):
+def _chunked_from_env() -> bool:
+    return os.getenv("STT_CHUNKED", "").lower() in ("1", "true", "yes")
+
+
+def transcription_version() -> str:
+    """Identifies the transcription setup, so cached transcripts can be invalidated."""
+    return f"{os.getenv('STT_BACKEND', 'google')}/{'chunked' if _chunked_from_env() else 'whole'}"
+
+
+def _fixed_windows(start: int, end: int, window_ms: int, overlap_ms: int) -> List[Tuple[int, int]]:
+    step = max(1, window_ms - overlap_ms)
+    windows = []
+    for window_start in range(start, end, step):
+        windows.append((window_start, min(window_start + window_ms, end)))
+        if window_start + window_ms >= end:
+            break
+    return windows
+
+
+def split_audio(audio: AudioSegment, window_ms=30000, overlap_ms=1000, on_silence=True,
+                min_silence_len=500, silence_thresh=None) -> List[Tuple[int, int]]:
     """
-    Converts speech from an audio file to punctuated Hebrew text
+    Split audio into (start_ms, end_ms) spans of at most `window_ms`.
+
+    With `on_silence`, spans are cut at pauses and consecutive speech is packed
+    into the same span; speech longer than a window falls back to fixed windows
+    that overlap by `overlap_ms`.
+    """
+    if not on_silence:
+        return _fixed_windows(0, len(audio), window_ms, overlap_ms)
+
+    if silence_thresh is None:
+        silence_thresh = audio.dBFS - 16
+    spans = []
+    for start, end in detect_nonsilent(audio, min_silence_len=min_silence_len, silence_thresh=silence_thresh):
+        if end - start > window_ms:
+            spans.extend(_fixed_windows(start, end, window_ms, overlap_ms))
+        elif spans and end - spans[-1][0] <= window_ms:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def transcribe_chunks(input_file, backend=None, window_ms=30000, overlap_ms=1000, on_silence=True, max_workers=4):
+    """
+    Transcribe an audio file chunk by chunk with bounded parallelism.
+
+    Returns segments ordered by time, each with `start`/`end` in seconds and the
+    chunk's `text`. A chunk that fails is returned with an `error` instead of
+    failing the whole transcript.
+    """
+    backend = backend or get_backend()
+    with open_audio(input_file) as audio_file:
+        audio = AudioSegment.from_file(audio_file, format="wav")
+    spans = split_audio(audio, window_ms=window_ms, overlap_ms=overlap_ms, on_silence=on_silence)
+
+    def transcribe_span(span):
+        start, end = span
+        segment = {"start": start / 1000, "end": end / 1000, "text": ""}
+        try:
+            segment["text"] = backend.transcribe(audio[start:end])
+        except Exception as e:
+            segment["error"] = str(e)
+        return segment
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(transcribe_span, spans))
+
+
+def transcribe_pcm(data: bytes, sample_rate=16000, sample_width=2, channels=1, backend=None) -> str:
+    """Transcribe raw PCM audio, e.g. a segment of a live call."""
+    audio = AudioSegment(data=data, sample_width=sample_width, frame_rate=sample_rate, channels=channels)
+    return (backend or get_backend()).transcribe(audio)
+
+
+class LiveAudioBuffer:
+    """
+    Collects raw PCM from a live call and cuts it into segments to transcribe.
+
+    Once `window_ms` of audio is buffered, a segment is cut at the last pause
+    of at least `min_silence_len`, so words are not split between segments;
+    without a pause, it is cut at `max_window_ms`.
+    """
+
+    def __init__(self, sample_rate=16000, sample_width=2, channels=1, window_ms=5000, max_window_ms=15000,
+                 min_silence_len=300, silence_thresh=-40):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self.window_ms = window_ms
+        self.max_window_ms = max_window_ms
+        self.min_silence_len = min_silence_len
+        self.silence_thresh = silence_thresh
+        self.position_ms = 0
+        self._buffer = bytearray()
+
+    @property
+    def _bytes_per_ms(self) -> float:
+        return self.sample_rate * self.sample_width * self.channels / 1000
+
+    def _buffered_ms(self) -> int:
+        return int(len(self._buffer) / self._bytes_per_ms)
+
+    def _cut_point(self) -> Optional[int]:
+        audio = AudioSegment(data=bytes(self._buffer), sample_width=self.sample_width,
+                             frame_rate=self.sample_rate, channels=self.channels)
+        pauses = detect_silence(audio[:self.max_window_ms], min_silence_len=self.min_silence_len,
+                                silence_thresh=self.silence_thresh)
+        # Ignore pauses early in the buffer, which would make for very short segments
+        pauses = [(start, end) for start, end in pauses if start >= self.window_ms // 2]
+        if pauses:
+            start, end = pauses[-1]
+            return (start + end) // 2
+        if len(audio) >= self.max_window_ms:
+            return self.max_window_ms
+        return None
+
+    def _take(self, ms: int) -> Tuple[int, int, bytes]:
+        frame_size = self.sample_width * self.channels
+        size = min(len(self._buffer), int(ms * self._bytes_per_ms) // frame_size * frame_size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        start = self.position_ms
+        self.position_ms += int(size / self._bytes_per_ms)
+        return start, self.position_ms, data
+
+    def feed(self, data: bytes) -> List[Tuple[int, int, bytes]]:
+        """Add audio; returns the (start_ms, end_ms, pcm) segments that are ready."""
+        self._buffer.extend(data)
+        segments = []
+        while self._buffered_ms() >= self.window_ms:
+            cut = self._cut_point()
+            if cut is None:
+                break
+            segments.append(self._take(cut))
+        return segments
+
+    def flush(self) -> Optional[Tuple[int, int, bytes]]:
+        """The remaining audio, at the end of the call."""
+        return self._take(self._buffered_ms() + 1) if self._buffer else None
+
+
+def _overlap_length(previous: List[str], current: List[str], max_words=20) -> int:
+    """Length of the longest run of words that ends `previous` and starts `current`."""
+    for length in range(min(len(previous), len(current), max_words), 0, -1):
+        if previous[-length:] == current[:length]:
+            return length
+    return 0
+
+
+def stitch_segments(segments) -> List[dict]:
+    """
+    Segments in order, with the words repeated by overlapping windows dropped
+    from each one's text. Only a segment that starts before the previous one
+    ends is trimmed; spans split at silence don't overlap, so words really
+    repeated across a pause are kept.
+    """
+    words: List[str] = []
+    previous_end = None
+    stitched = []
+    for segment in segments:
+        current = segment["text"].split()
+        overlaps = previous_end is not None and segment["start"] < previous_end
+        kept = current[_overlap_length(words, current):] if overlaps else current
+        words.extend(kept)
+        previous_end = segment["end"]
+        stitched.append({**segment, "text": " ".join(kept)})
+    return stitched
+
+
+def transcribe_file(input_file, chunked=None, backend=None) -> dict:
+    """
+    Transcribe an audio file into {"text", "segments", "errors"}.
+
+    Segments carry `start`/`end` offsets in seconds and their text; without
+    chunking the whole file is one segment. Chunks that failed are left out of
+    the text and listed in `errors` with their offsets. When the whole file
+    fails, the text is the error message, as it has always been.
     """
     if not os.path.exists(input_file):
-        return "File not found. Please verify the path."
+        return {"text": "File not found. Please verify the path.", "segments": [], "errors": []}
+
+    if chunked is None:
+        chunked = _chunked_from_env()
 
     try:
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(input_file) as source:
-            audio_data = recognizer.record(source)
-            return recognizer.recognize_google(audio_data, language="he-IL")
+        if chunked:
+            segments = transcribe_chunks(
+                input_file,
+                backend=backend,
+                window_ms=int(os.getenv("STT_WINDOW_MS", "30000")),
+                overlap_ms=int(os.getenv("STT_OVERLAP_MS", "1000")),
+                max_workers=int(os.getenv("STT_MAX_WORKERS", "4")),
+            )
+            errors = [segment for segment in segments if "error" in segment]
+            if segments and len(errors) == len(segments):
+                raise RuntimeError(errors[0]["error"])
+            for error in errors:
+                print(f"Transcription of {error['start']}-{error['end']}s failed: {error['error']}")
+            segments = stitch_segments([segment for segment in segments if "error" not in segment])
+            text = " ".join(segment["text"] for segment in segments if segment["text"])
+            return {"text": text, "segments": segments, "errors": errors}
+
+        if backend is not None or os.getenv("STT_BACKEND", "google") != "google":
+            with open_audio(input_file) as audio_file:
+                audio = AudioSegment.from_file(audio_file, format="wav")
+            text, duration = (backend or get_backend()).transcribe(audio), len(audio) / 1000
+        else:
+            recognizer = sr.Recognizer()
+            with open_audio(input_file) as audio_file, sr.AudioFile(audio_file) as source:
+                audio_data = recognizer.record(source)
+                duration = source.DURATION
+                text = recognizer.recognize_google(audio_data, language="he-IL")
+        return {"text": text, "segments": [{"start": 0.0, "end": duration, "text": text}], "errors": []}
     except Exception as e:
-        return f"Transcription error: {e}"
+        error = {"start": None, "end": None, "error": str(e)}
+        return {"text": f"Transcription error: {e}", "segments": [], "errors": [error]}
+
+
+def speech_to_text_func(input_file, chunked=None, backend=None):
+    """
+    Converts speech from an audio file to punctuated Hebrew text
+
+    With `chunked` (or STT_CHUNKED=1) the file is split on silence and the
+    chunks are transcribed concurrently, so long calls don't have to be held
+    in memory and sent as a single request.
+    """
+    return transcribe_file(input_file, chunked=chunked, backend=backend)["text"]
 
 def main():
     input_file = input("Enter WAV audio file path: ").strip()
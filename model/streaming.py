@@ -0,0 +1,53 @@
+from typing import Callable, List, Optional, Sequence, Tuple
+
+Sentence = List[Tuple[str, str]]
+SegmentAnalysis = Tuple[int, List[str], List[str], Sentence]
+
+
+def normalize_score(total_score: int) -> int:
+    """Map a raw lexicon score onto the 0-98 risk scale used for cases."""
+    return 0 if total_score <= 5 else min(98, int((total_score / 600) * 100))
+
+
+class StreamingScorer:
+    """
+    Running score of a transcript that arrives segment by segment.
+
+    Only the new segment is lemmatized and matched. The unfinished last sentence
+    of the previous segment is carried over as (text, lemma) pairs, so a phrase
+    spoken across a segment boundary is still found. `analyze_segment` has the
+    signature of SuspiciousWordDetector.analyze_segment; callers that run the
+    detector elsewhere (e.g. in a worker process) can pass its result to
+    `apply` instead.
+    """
+
+    def __init__(self, analyze_segment: Optional[Callable[[str, Sequence[Tuple[str, str]]], SegmentAnalysis]] = None):
+        self.analyze_segment = analyze_segment
+        self.total_score = 0
+        self.categories: List[str] = []
+        self.phrases: List[str] = []
+        self.carry: Sentence = []
+        self.segments = 0
+
+    @property
+    def score(self) -> int:
+        return normalize_score(self.total_score)
+
+    def add_segment(self, text: str):
+        return self.apply(self.analyze_segment(text, self.carry))
+
+    def apply(self, analysis: SegmentAnalysis):
+        """Add one segment's analysis and return the updated totals."""
+        total_score, categories, phrases, carry = analysis
+        self.total_score += total_score
+        self.categories.extend(category for category in categories if category not in self.categories)
+        self.phrases.extend(phrases)
+        self.carry = list(carry)
+        self.segments += 1
+        return {
+            "score": self.score,
+            "totalScore": self.total_score,
+            "categories": list(self.categories),
+            "phrases": list(self.phrases),
+            "newPhrases": list(phrases),
+        }
@@ -1,37 +1,220 @@
-from groq import Groq
+from groq import APIConnectionError, APITimeoutError, AsyncGroq, Groq, InternalServerError, RateLimitError
+import asyncio
 import os
- 
+import random
+import re
+from typing import Callable, List, Optional
 
-def summarize_text(input_text):
-    """
-    Sends a Hebrew conversation to the Groq API for summarization and returns the summary.
+MODEL_NAME = "llama-3.3-70b-versatile"
+SYSTEM_PROMPT = "  בתור מסכם טקסטים מוסמך של המ  סכם לי את הטקסט הבא בצורה תמציתית ומדוייקת ושים דגש על משפטים שקיים חשד לפעילות פלילית בהם"
+MERGE_PROMPT = "לפניך סיכומים חלקיים של חלקים עוקבים מאותה שיחה. אחד אותם לסיכום אחד תמציתי ומדוייק של כל השיחה ושים דגש על משפטים שקיים חשד לפעילות פלילית בהם"
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
-    Args:
-        input_text (str): The conversation text in Hebrew to be summarized.
+# Shared clients, so every summary reuses the same HTTP connection pool
+_client = None
+_async_client = None
+_semaphore = None
 
-    Returns:
-        str: The summary provided by the Groq API.
-    """
-    client = Groq(api_key= os.getenv("GROQ_API_KEY"))
 
-    # Prepare the request
-    completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
+def _client_options():
+    """Client settings; GROQ_BASE_URL points the summarizer at another endpoint, e.g. a local mock."""
+    return {
+        "api_key": os.getenv("GROQ_API_KEY"),
+        "base_url": os.getenv("GROQ_BASE_URL") or None,
+        "timeout": float(os.getenv("SUMMARY_TIMEOUT_SECONDS", "60")),
+        "max_retries": 0,  # Retries are handled here, with jitter
+    }
+
+
+def get_client() -> Groq:
+    global _client
+    if _client is None:
+        _client = Groq(**_client_options())
+    return _client
+
+
+def get_async_client() -> AsyncGroq:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncGroq(**_client_options())
+    return _async_client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(int(os.getenv("SUMMARY_CONCURRENCY", "4")))
+    return _semaphore
+
+
+def _completion_request(input_text, max_tokens=1024, system_prompt=SYSTEM_PROMPT):
+    return dict(
+        model=MODEL_NAME,
         messages=[
-            {
-                "role": "system",
-                "content": (
-                    "  בתור מסכם טקסטים מוסמך של המ  סכם לי את הטקסט הבא בצורה תמציתית ומדוייקת ושים דגש על משפטים שקיים חשד לפעילות פלילית בהם"  ),
-            },
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": input_text},
         ],
         temperature=0,
-        max_tokens=1024,
+        max_tokens=max_tokens,
         top_p=1,
         stream=True,
         stop=None,
     )
 
+
+def _retry_delay(error, attempt):
+    """
+    Jittered exponential backoff. A server-provided Retry-After is a floor:
+    the wait is never shorter than it, with up to one base delay of jitter on top.
+    """
+    base = float(os.getenv("SUMMARY_BACKOFF_SECONDS", "1"))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        else:
+            return retry_after + random.uniform(0, base)
+    delay = base * 2 ** attempt
+    return random.uniform(delay / 2, delay)
+
+
+async def _complete(input_text, max_tokens=1024, system_prompt=SYSTEM_PROMPT,
+                    on_text: Optional[Callable[[str], None]] = None) -> str:
+    """
+    One streamed completion. At most SUMMARY_CONCURRENCY requests are in flight
+    at once, and rate-limit, timeout and server errors are retried up to
+    SUMMARY_MAX_RETRIES times with jittered exponential backoff. `on_text` gets
+    the text received so far after every chunk; a retry starts it over.
+    """
+    max_retries = int(os.getenv("SUMMARY_MAX_RETRIES", "3"))
+    for attempt in range(max_retries + 1):
+        try:
+            async with _get_semaphore():
+                completion = await get_async_client().chat.completions.create(
+                    **_completion_request(input_text, max_tokens, system_prompt)
+                )
+                summary = ""
+                async for chunk in completion:
+                    if chunk.choices[0].delta.content:
+                        summary += chunk.choices[0].delta.content
+                        if on_text:
+                            on_text(summary)
+                return summary
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt))
+
+
+def _chunk_chars() -> int:
+    return int(os.getenv("SUMMARY_CHUNK_CHARS", "8000"))
+
+
+def summary_version() -> str:
+    """Identifies how summaries are produced, so cached summaries can be invalidated."""
+    return f"{MODEL_NAME}/chunks-{_chunk_chars()}"
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Split text at sentence ends, and at spaces when a sentence alone is too long."""
+    pieces = []
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_transcript(text: str, max_chars: int) -> List[str]:
+    """
+    Split a transcript into chunks of at most `max_chars`, packing whole speaker
+    turns (lines) together and only breaking a turn between sentences when it
+    does not fit in a chunk by itself.
+    """
+    pieces = []
+    for turn in text.splitlines():
+        turn = turn.strip()
+        if turn:
+            pieces.extend([turn] if len(turn) <= max_chars else _split_long(turn, max_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def summarize_text_async(input_text, max_tokens=1024,
+                               on_progress: Optional[Callable[[str, dict], None]] = None):
+    """
+    Async version of summarize_text.
+
+    Transcripts longer than SUMMARY_CHUNK_CHARS are summarized map-reduce
+    style: the chunks from split_transcript are summarized concurrently and the
+    partial summaries are then merged, in more than one round if they are still
+    too long together. `on_progress(event, data)` is called with "partial"
+    ({"index", "total", "summary"}) as each chunk summary finishes, and with
+    "summary" ({"summary"}) carrying the final summary so far while it streams.
+    """
+    def stream_final(text):
+        if on_progress:
+            on_progress("summary", {"summary": text})
+
+    max_chars = _chunk_chars()
+    chunks = split_transcript(input_text, max_chars)
+    if len(chunks) <= 1:
+        return await _complete(input_text, max_tokens, on_text=stream_final)
+
+    chunk_max_tokens = int(os.getenv("SUMMARY_CHUNK_MAX_TOKENS", "512"))
+
+    async def summarize_chunk(index, chunk):
+        summary = await _complete(chunk, chunk_max_tokens)
+        if on_progress:
+            on_progress("partial", {"index": index, "total": len(chunks), "summary": summary})
+        return summary
+
+    partials = await asyncio.gather(*(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+
+    # Merge groups of partial summaries until they fit in one request
+    merged = "\n\n".join(partials)
+    while len(merged) > max_chars:
+        groups = split_transcript(merged, max_chars)
+        if len(groups) <= 1:
+            break
+        partials = await asyncio.gather(*(
+            _complete(group, chunk_max_tokens, system_prompt=MERGE_PROMPT) for group in groups
+        ))
+        merged = "\n\n".join(partials)
+    return await _complete(merged, max_tokens, system_prompt=MERGE_PROMPT, on_text=stream_final)
+
+
+def summarize_text(input_text):
+    """
+    Sends a Hebrew conversation to the Groq API for summarization and returns the summary.
+
+    Args:
+        input_text (str): The conversation text in Hebrew to be summarized.
+
+    Returns:
+        str: The summary provided by the Groq API.
+    """
+    completion = get_client().chat.completions.create(**_completion_request(input_text))
+
     # Collect the response
     summary = ""
     for chunk in completion:
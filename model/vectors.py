@@ -0,0 +1,80 @@
+import argparse
+import os
+
+import numpy as np
+from gensim.models import KeyedVectors
+
+
+def mmap_path(binary_file_path: str) -> str:
+    """Where the memory-mappable copy of a word-vector model lives."""
+    return os.path.splitext(binary_file_path)[0] + ".mmap.kv"
+
+
+def _is_current(binary_file_path: str, converted_path: str) -> bool:
+    """Whether the converted copy exists and is not older than the model it came from."""
+    try:
+        return os.path.getmtime(converted_path) >= os.path.getmtime(binary_file_path)
+    except FileNotFoundError:
+        return False
+
+
+def convert_for_mmap(binary_file_path: str, output_path=None) -> str:
+    """
+    Write a copy of the model with unit-length float32 vectors stored as a
+    separate .npy file, so it can be loaded with mmap='r' and shared between
+    processes through the page cache.
+
+    The copy is saved under a temporary name and moved into place, main file
+    last; loaders that find no main file use the original model instead, so a
+    crash never leaves a truncated copy behind.
+    """
+    output_path = output_path or mmap_path(binary_file_path)
+    kv = KeyedVectors.load(binary_file_path)
+    kv.vectors = np.ascontiguousarray(kv.get_normed_vectors(), dtype=np.float32)
+    kv.norms = None
+    kv.vectors_normalized = True
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    temp_path = os.path.join(directory, f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+    # sep_limit=0 stores every array in its own .npy file, which is what mmap needs
+    kv.save(temp_path, sep_limit=0)
+    sidecars = [name for name in os.listdir(directory) if name.startswith(os.path.basename(temp_path) + ".")]
+    try:
+        os.remove(output_path)
+    except FileNotFoundError:
+        pass
+    for name in sidecars:
+        suffix = name[len(os.path.basename(temp_path)):]
+        os.replace(os.path.join(directory, name), output_path + suffix)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def ensure_mmap_vectors(binary_file_path: str) -> str:
+    """Convert the model if it has no memory-mappable copy yet, or the model changed since."""
+    path = mmap_path(binary_file_path)
+    if not _is_current(binary_file_path, path):
+        convert_for_mmap(binary_file_path, path)
+    return path
+
+
+def load_vectors(binary_file_path: str, mmap=True) -> KeyedVectors:
+    """
+    Load word vectors, memory-mapped when an up-to-date converted copy exists.
+    The original .bin is still accepted and loaded into the heap otherwise.
+    """
+    converted = mmap_path(binary_file_path)
+    if mmap and _is_current(binary_file_path, converted):
+        return KeyedVectors.load(converted, mmap='r')
+    return KeyedVectors.load(binary_file_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a word-vector model for memory-mapped loading.")
+    parser.add_argument("model", help="KeyedVectors file, e.g. model/words2vec.bin")
+    args = parser.parse_args()
+    print(f"Saved memory-mappable vectors to {convert_for_mmap(args.model)}")
+
+
+if __name__ == "__main__":
+    main()